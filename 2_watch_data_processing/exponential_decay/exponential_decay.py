@@ -31,7 +31,6 @@
 # SOFTWARE.
 # -----------------------------------------------------------------------------
 
-import obspy as obspy
 from scipy.io import loadmat
 import numpy as np
 import matplotlib.pyplot as plt
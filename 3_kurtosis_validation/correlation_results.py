@@ -0,0 +1,145 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Python version of correlation_results.m. Instead of hard-coding the kurtosis of every task, the
+# steady state kurtosis values are read from the exponential decay results (the last value of each kurtosis
+# saturation curve), and the GT vs watch linear regression, r^2 and p-values are computed for the slow and fast
+# speeds in a single vectorized pass. Optional bootstrap confidence intervals are computed in blocks.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import os
+import numpy as np
+from scipy.io import loadmat
+from scipy.stats import t as t_dist
+
+TASKS = ['shuffling_cards', 'cup_stacking', 'arm_wrestling', 'handshaking', 'exploration', 'simulated_normal']
+SPEEDS = ['slow', 'fast']
+
+
+def load_steady_state_kurtosis(folder, source, speed, tasks=TASKS):
+    # Read the last (steady state) value of every kurtosis saturation curve saved by the validation scripts
+    values = []
+    for task in tasks:
+        filename = os.path.join(folder, task + '_' + source + '_decay_' + speed + '.mat')
+        if not os.path.exists(filename):
+            # simulated_normal.m saves the slow watch results without the source in the name
+            filename = os.path.join(folder, task + '_decay_' + speed + '.mat')
+        kurt_cut = loadmat(filename)['kurt_cut_' + source.lower() + '_' + speed].flatten()
+        kurt_cut = kurt_cut[~np.isnan(kurt_cut)]     # Remove NaNs
+        values.append(kurt_cut[-1])
+    return np.array(values)
+
+
+def load_kurtosis_table(folder, tasks=TASKS, speeds=SPEEDS):
+    # Returns two arrays with shape (len(speeds), len(tasks)) with the GT and the watch kurtosis
+    gt = np.array([load_steady_state_kurtosis(folder, 'GT', speed, tasks) for speed in speeds])
+    watch = np.array([load_steady_state_kurtosis(folder, 'watch', speed, tasks) for speed in speeds])
+    return gt, watch
+
+
+def linear_fit(x, y):
+    # Least squares fit y = m*x + n along the last axis, for every row at once (like fitlm + corrcoef in MATLAB)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n_points = x.shape[-1]
+
+    dx = x - x.mean(axis=-1, keepdims=True)
+    dy = y - y.mean(axis=-1, keepdims=True)
+    sxx = np.sum(dx*dx, axis=-1)
+    syy = np.sum(dy*dy, axis=-1)
+    sxy = np.sum(dx*dy, axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = sxy/sxx                                     # slope
+        n = y.mean(axis=-1) - m*x.mean(axis=-1)         # intercept
+        r = sxy/np.sqrt(sxx*syy)                        # Pearson correlation coefficient
+        t_stat = r*np.sqrt((n_points - 2)/(1 - r*r))
+    p_val = 2*t_dist.sf(np.abs(t_stat), n_points - 2)
+    return m, n, r*r, p_val
+
+
+def bootstrap_fit(x, y, n_boot=10000, block_size=1000, confidence=0.95, seed=None):
+    # Bootstrap (resampling the pairs) confidence intervals of the slope, intercept and r^2 of every row.
+    # The resamples are evaluated in blocks of block_size so the memory used is bounded
+    x = np.atleast_2d(np.asarray(x, dtype=float))
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    rng = np.random.default_rng(seed)
+    n_rows, n_points = x.shape
+
+    m_boot = np.empty((n_boot, n_rows))
+    n_boot_ = np.empty((n_boot, n_rows))
+    r2_boot = np.empty((n_boot, n_rows))
+    for start in range(0, n_boot, block_size):
+        stop = min(start + block_size, n_boot)
+        idx = rng.integers(0, n_points, size=(stop - start, n_rows, n_points))
+        rows = np.arange(n_rows)[None, :, None]
+        m_boot[start:stop], n_boot_[start:stop], r2_boot[start:stop], _ = linear_fit(x[rows, idx], y[rows, idx])
+
+    # Resamples with a single distinct x value have no fit and are ignored
+    q = 100*np.array([(1 - confidence)/2, (1 + confidence)/2])
+    return (np.nanpercentile(m_boot, q, axis=0).T,
+            np.nanpercentile(n_boot_, q, axis=0).T,
+            np.nanpercentile(r2_boot, q, axis=0).T)
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    gt, watch = load_kurtosis_table('exponential_decay_data')
+
+    # Excess kurtosis
+    gt = gt - 3
+    watch = watch - 3
+
+    m, n, r2, p_val = linear_fit(gt, watch)
+    m_ci, n_ci, r2_ci = bootstrap_fit(gt, watch, seed=0)
+
+    for i, speed in enumerate(SPEEDS):
+        print(speed, ': y = ', round(m[i], 2), 'x + ', round(n[i], 2), '; r^2 = ', round(r2[i], 2),
+              '; p = ', round(p_val[i], 4))
+        print('    95% CI slope: ', m_ci[i], ' intercept: ', n_ci[i], ' r^2: ', r2_ci[i])
+
+    # Correlation
+    plt.figure()
+    colors = ['r', 'b']
+    for i, speed in enumerate(SPEEDS):
+        plt.plot(gt[i], watch[i], colors[i] + '*', markersize=10,
+                 label=speed + ' data points; r^2 = ' + str(round(r2[i], 2)) + '; p = ' + str(round(p_val[i], 4)))
+    for i, speed in enumerate(SPEEDS):
+        plt.plot(gt[i], m[i]*gt[i] + n[i], color=colors[i], linewidth=4,
+                 label=speed + ' fit: y = ' + str(round(m[i], 2)) + 'x ' + str(round(n[i], 2)))
+
+    # Plot a line y=x
+    plt.plot(np.arange(0, 8, 0.01), np.arange(0, 8, 0.01), 'k')
+    plt.title('Kurtosis')
+    plt.xlabel('Planned kurtosis')
+    plt.ylabel('Measured kurtosis')
+    plt.xlim([-2, 5])
+    plt.grid(True)
+    plt.legend()
+    plt.show()
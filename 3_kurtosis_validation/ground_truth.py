@@ -0,0 +1,127 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Python port of get_GT_tiltangle() from the MATLAB validation scripts. The forward kinematics of
+# the 3-link robot are computed for every sample at once with batched (N, 4, 4) DH transforms, so the ground
+# truth tilt angles are obtained without looping over the samples or depending on the Robotics Toolbox.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import numpy as np
+
+# Robot links using the DH parameters (same as the Link() definitions in the MATLAB scripts)
+DH_D = np.array([0.056, 0, 0.3])
+DH_A = np.array([0, 0, 0])
+DH_ALPHA = np.array([-np.pi/2, np.pi/2, 0])
+
+V_WRIST = np.array([1, 0, 0])   # Original vector of the wrist x direction
+B_NORMAL = np.array([0, 0, 1])  # The normal direction (End-Effector pointing upwards). Defined as Z here.
+
+
+def dh_transforms(q, d=DH_D, a=DH_A, alpha=DH_ALPHA):
+    # q has shape (N, n_links) in radians. Returns the standard DH link transforms with shape (N, n_links, 4, 4)
+    q = np.atleast_2d(q)
+    ct, st = np.cos(q), np.sin(q)
+    ca, sa = np.cos(alpha), np.sin(alpha)
+
+    T = np.zeros(q.shape + (4, 4))
+    T[..., 0, 0] = ct
+    T[..., 0, 1] = -st*ca
+    T[..., 0, 2] = st*sa
+    T[..., 0, 3] = a*ct
+    T[..., 1, 0] = st
+    T[..., 1, 1] = ct*ca
+    T[..., 1, 2] = -ct*sa
+    T[..., 1, 3] = a*st
+    T[..., 2, 1] = sa
+    T[..., 2, 2] = ca
+    T[..., 2, 3] = d
+    T[..., 3, 3] = 1
+    return T
+
+
+def fkine(q, d=DH_D, a=DH_A, alpha=DH_ALPHA):
+    # Batched direct kinematics, equivalent to bot.fkine(q) for every row of q. Returns (N, 4, 4)
+    T = dh_transforms(q, d, a, alpha)
+    Ttrue = T[:, 0]
+    for link in range(1, T.shape[1]):
+        Ttrue = np.einsum('nij,njk->nik', Ttrue, T[:, link])
+    return Ttrue
+
+
+def get_GT_tiltangle(rot_gt, ext_gt, sup_gt, v=V_WRIST, B=B_NORMAL, data_size=None):
+    # Joint trajectories in degrees, as in the MATLAB scripts. Only the first data_size samples are used
+    if data_size is None:
+        data_size = len(rot_gt)
+    qtrue = np.deg2rad(np.column_stack((np.asarray(rot_gt, dtype=float).ravel()[:data_size],
+                                        np.asarray(ext_gt, dtype=float).ravel()[:data_size],
+                                        np.asarray(sup_gt, dtype=float).ravel()[:data_size])))
+
+    Rtrue = fkine(qtrue)[:, :3, :3]                     # Extract the rotation matrices
+    Atrue = np.einsum('nij,j->ni', Rtrue, v)            # Rotate the original vector of the wrist x direction
+
+    # Calculate the angle between A and B (the tilt angle)
+    cos_angle = Atrue @ B / (np.linalg.norm(Atrue, axis=1) * np.linalg.norm(B))
+    radAngle_gt = np.arccos(np.clip(cos_angle, -1, 1))
+    return np.rad2deg(radAngle_gt)
+
+
+def one_trajectory_arm_wrestling(all_length):
+    # Port of one_trajectory() from arm_wrestling.m
+    rot_gt = 90*np.ones(all_length*2)
+
+    ext_gt = np.linspace(0, -90, all_length + 1)
+    ext_gt = np.concatenate((ext_gt[:-1], ext_gt[::-1]))
+    ext_gt = ext_gt[:-1]  # dont save the last 0
+
+    sup_gt = np.zeros(all_length*2)
+    return rot_gt, ext_gt, sup_gt
+
+
+if __name__ == '__main__':
+    from scipy.io import loadmat
+    from scipy.stats import kurtosis
+    import timeit
+
+    traj_repetitions = 15
+
+    for speed in ['slow', 'fast']:
+        data = loadmat('import_data/arm_wrestling_' + speed + '_results.mat')
+        data_size = data['watch_tiltAngle_filt'].size
+        all_length = int(np.ceil(data_size/(traj_repetitions*2)))
+
+        rot_gt, ext_gt, sup_gt = one_trajectory_arm_wrestling(all_length)
+        ext_gt = np.tile(ext_gt, traj_repetitions)
+        rot_gt = 90*np.ones(ext_gt.size)
+        sup_gt = np.zeros(ext_gt.size)
+
+        start_time = timeit.default_timer()
+        tiltAngles_fromGT = get_GT_tiltangle(rot_gt, ext_gt, sup_gt, data_size=data_size)
+        stop_time = timeit.default_timer()
+
+        print(speed, 'GT kurtosis: ', kurtosis(tiltAngles_fromGT, fisher=False),
+              ' computed in ', (stop_time - start_time)*1000, ' ms')
@@ -0,0 +1,149 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Streaming activity segmentation of the watch recordings. The rolling variance of the accelerometer
+# magnitude (movement energy) and of the tilt angle are updated in O(1) per sample; a sample is active when either
+# exceeds its threshold, and the rest/movement state only changes after minMove seconds of activity or minRest seconds
+# of stillness. The movement segment boundaries are emitted in a single pass, and the longest movement segment is
+# taken as the experiment, instead of the start:end indexes hard-coded in the watch scripts after looking at plots.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+from math import sqrt, acos, degrees
+from rsk_engine import RollingSampleKurtosis
+from long_session import iter_chunks
+
+# Indexes picked by hand in the watch scripts (filtered_accel_angle[start:end]), kept as a reference
+HAND_CUTS = {'arm_wrestling': {'slow': (2046, 12464), 'fast': (1400, 4568)},
+             'cup_stacking': {'slow': (9500, 21440), 'fast': (1925, 5541)},
+             'exploration': {'slow': (1310, 14920), 'fast': (1071, 5825)},
+             'handshaking': {'slow': (1610, 16270), 'fast': (1280, 6385)},
+             'shuffling_cards': {'slow': (2459, 13435), 'fast': (1425, 5025)},
+             'simulated_normal': {'slow': (25898, 77067), 'fast': (11977, 38948)}}
+
+
+class ActivitySegmenter:
+
+    def __init__(self, fs=50, window=2.0, accelThreshold=0.3, tiltThreshold=3.0, minRest=3.0, minMove=1.0):
+        self.windowSize = max(int(window*fs), 1)
+        # Rolling windows of |a| (m/s^2) and of the tilt angle (degrees), only their variance is read
+        self.accel = RollingSampleKurtosis(self.windowSize)
+        self.tilt = RollingSampleKurtosis(self.windowSize)
+        # Thresholds on the standard deviations, compared as variances
+        self.accelThreshold = accelThreshold**2
+        self.tiltThreshold = tiltThreshold**2
+        self.minRest = int(minRest*fs)
+        self.minMove = int(minMove*fs)
+
+        self.index = 0          # Index of the next sample
+        self.moving = False
+        self.count = 0          # Consecutive samples disagreeing with the current state
+        self.start = None
+        self.segments = []      # (start, end) of the closed movement segments
+
+    def push(self, xs, ys, zs):
+        # Returns ('start', index) or ('end', index) when a movement segment boundary is detected, else None
+        mag = sqrt(xs*xs + ys*ys + zs*zs)
+        self.accel.push(mag)
+        self.tilt.push(degrees(acos(min(max(zs/mag, -1.0), 1.0))) if mag > 0 else 0.0)
+        i = self.index
+        self.index += 1
+
+        active = self.accel.variance() > self.accelThreshold or self.tilt.variance() > self.tiltThreshold
+        if active == self.moving:
+            self.count = 0
+            return None
+        self.count += 1
+        if self.count < (self.minMove if active else self.minRest):
+            return None
+
+        self.moving = active
+        self.count = 0
+        if active:
+            # The movement started when the first of the consecutive active samples arrived
+            self.start = max(i - self.minMove, 0)
+            return 'start', self.start
+        # The window stays above the threshold until the last moving samples leave it
+        end = max(i - self.minRest - self.windowSize, self.start)
+        self.segments.append((self.start, end))
+        return 'end', end
+
+    def push_many(self, xs, ys, zs):
+        return [event for event in map(self.push, xs, ys, zs) if event is not None]
+
+    def finish(self):
+        # Close the movement segment that is still open at the end of the recording
+        if self.moving:
+            self.segments.append((self.start, self.index))
+            self.moving = False
+            return 'end', self.index
+        return None
+
+
+def experiment_segment(segments):
+    # The experiment is the longest movement segment (the setup movements before it are shorter)
+    if not segments:
+        return None
+    return max(segments, key=lambda segment: segment[1] - segment[0])
+
+
+def segment_recording(xs, ys, zs, **options):
+    # Single pass over a whole recording. Returns the experiment (start, end) and all the movement segments
+    segmenter = ActivitySegmenter(**options)
+    segmenter.push_many(xs, ys, zs)
+    segmenter.finish()
+    return experiment_segment(segmenter.segments), segmenter.segments
+
+
+def segment_file(path, chunkRows=16384, **options):
+    # Same as segment_recording() for a watch CSV, read one chunk at a time (first pass of the batch processing,
+    # the (start, end) found is then given to long_session.iter_processed)
+    segmenter = ActivitySegmenter(**options)
+    with open(path, 'rb') as file:
+        for rows in iter_chunks(file, chunkRows):
+            segmenter.push_many(rows[:, 2].tolist(), rows[:, 3].tolist(), rows[:, 4].tolist())
+    segmenter.finish()
+    return experiment_segment(segmenter.segments), segmenter.segments
+
+
+if __name__ == '__main__':
+    import glob
+    import os
+    import timeit
+    from replay_simulator import RECORDINGS, load_recording
+
+    for path in sorted(glob.glob(RECORDINGS)):
+        task = os.path.basename(os.path.dirname(path))
+        speed = 'slow' if '_slow_' in os.path.basename(path) else 'fast'
+        rows = load_recording(path)
+
+        start_time = timeit.default_timer()
+        experiment, segments = segment_recording(rows[:, 2].tolist(), rows[:, 3].tolist(), rows[:, 4].tolist())
+        elapsed = timeit.default_timer() - start_time
+
+        print(task, speed, ': detected ', experiment, ' hand-picked ', HAND_CUTS.get(task, {}).get(speed), ' (',
+              len(segments), ' segments, ', round(elapsed*1e6/len(rows), 2), ' us/sample)')
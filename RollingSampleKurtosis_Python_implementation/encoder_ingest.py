@@ -0,0 +1,224 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Live ground truth from the robot. The encoder_rtos.ino firmware prints the joint angles over serial
+# (Rotation:<deg>, Extension:<deg>, Supination:<deg>, at 115200 baud). This stage reads that stream, keeps the
+# latest angle of every joint, samples them at the watch rate, computes the ground truth tilt angles with the
+# batched forward kinematics of ground_truth.py and feeds a rolling kurtosis engine, so the GT and watch kurtosis
+# can be compared while the experiment is running. A pty stand-in of the firmware is used for testing.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import os
+import select
+import sys
+import threading
+import time
+import numpy as np
+from rsk_engine import RollingSampleKurtosis
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '3_kurtosis_validation'))
+from ground_truth import get_GT_tiltangle  # noqa: E402
+
+JOINTS = {b'Rotation': 0, b'Extension': 1, b'Supination': 2}
+PPR = 192       # Pulses Per Revolution, specified in the encoder settings
+
+
+class _RawSerial:
+    # Minimal stand-in for serial.Serial when pyserial is not installed: the device (e.g. a pty) is read as a
+    # raw file, with the same read timeout so the reader thread can be stopped
+    def __init__(self, port, timeout=0.1):
+        self.fd = os.open(port, os.O_RDONLY | os.O_NOCTTY)
+        self.timeout = timeout
+
+    def read(self, size):
+        ready, _, _ = select.select([self.fd], [], [], self.timeout)
+        return os.read(self.fd, size) if ready else b''
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_serial(port, baudrate=115200):
+    try:
+        import serial
+        return serial.Serial(port, baudrate, timeout=0.1)
+    except ImportError:
+        return _RawSerial(port)
+
+
+class EncoderGroundTruth:
+    # The firmware prints the already mapped angles (360*ticks/PPR). With ticks=True the values are taken as raw
+    # encoder counts and converted here
+
+    def __init__(self, maxSize=5000, fs=50, ticks=False, batch=25):
+        self.joints = np.zeros(3)           # Latest rotation, extension, supination (degrees)
+        self.engine = RollingSampleKurtosis(maxSize)
+        self.period = 1/fs
+        self.ticks = ticks
+        self.batch = batch                  # Joint samples per forward kinematics batch
+        self.nextSample = None
+        self.pending = []
+        self.samples = 0
+        self.lastTilt = None
+        # The engine is updated by the serial thread and read by the reporting thread
+        self.lock = threading.Lock()
+
+    def feed(self, lines, now=None):
+        for line in lines:
+            name, _, value = line.strip().partition(b':')
+            joint = JOINTS.get(name)
+            if joint is None:
+                continue                    # 'Moving to start', 'Event received', ...
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+            self.joints[joint] = 360*value/PPR if self.ticks else value
+        self.sample(time.perf_counter() if now is None else now)
+
+    def sample(self, now):
+        # Sample and hold the joint angles at the watch rate
+        if self.nextSample is None:
+            self.nextSample = now
+        while now >= self.nextSample:
+            self.pending.append(self.joints.copy())
+            self.nextSample += self.period
+        if len(self.pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        q = np.array(self.pending)
+        self.pending = []
+        tilt = get_GT_tiltangle(q[:, 0], q[:, 1], q[:, 2])
+        with self.lock:
+            self.engine.push_many(tilt.tolist())
+            self.samples += len(tilt)
+            self.lastTilt = tilt[-1]
+
+    def state(self):
+        # Consistent (samples, window length, kurtosis), never in the middle of a batch
+        with self.lock:
+            return self.samples, self.engine.iter, self.engine.kurtosis
+
+
+def read_serial(port, gt, stopEvent, baudrate=115200):
+    # Serial thread: read the stream in chunks, split the lines and feed them to the GT stage
+    device = open_serial(port, baudrate)
+    remainder = b''
+    try:
+        while not stopEvent.is_set():
+            chunk = device.read(4096)
+            if not chunk:
+                continue
+            lines = (remainder + chunk).split(b'\n')
+            remainder = lines.pop()
+            gt.feed(lines)
+    finally:
+        gt.flush()
+        device.close()
+
+
+class LiveAgreement:
+    # GT and watch kurtosis side by side. The two engines are fed at the same sample rate, so after the same
+    # time they hold windows of the same length
+
+    def __init__(self, gt, watchEngine):
+        self.gt = gt
+        self.watch = watchEngine
+
+    def report(self):
+        gtSamples, gtWindow, gtKurtosis = self.gt.state()
+        watchKurtosis = self.watch.kurtosis
+        return {
+            'gt_samples': gtSamples,
+            'gt_window': gtWindow,
+            'watch_window': self.watch.iter,
+            'gt_kurtosis': gtKurtosis,
+            'watch_kurtosis': watchKurtosis,
+            'difference': watchKurtosis - gtKurtosis,
+        }
+
+
+def firmware_stand_in(fd, rot, ext, sup, fs=50, speed=1.0):
+    # Writes the same lines as encoder_rtos.ino, one Rotation/Extension/Supination group per sample
+    os.write(fd, b'Moving to start\r\nEvent received\r\nRotation:0\r\nExtension:0\r\nSupination:0\r\n')
+    period = 1/(fs*speed)
+    start = time.perf_counter()
+    for i in range(len(rot)):
+        os.write(fd, 'Rotation:{}\r\nExtension:{}\r\nSupination:{}\r\n'.format(
+            int(rot[i]), int(ext[i]), int(sup[i])).encode())
+        time.sleep(max(0.0, start + (i + 1)*period - time.perf_counter()))
+
+
+if __name__ == '__main__':
+    import pty
+    import tty
+    from ground_truth import one_trajectory_arm_wrestling
+    from ingest_server import decode_lines, tilt_angle
+
+    SPEED = 10
+    MAX_SIZE = 1000
+    fs = 50
+
+    # Watch: the arm wrestling recording (slow), replayed at the same speed
+    with open('../2_watch_data_processing/arm_wrestling/_arm_wrestling_slow_v1_watchData.csv', 'rb') as file:
+        rows = decode_lines(file.read().split(b'\n'))[2046:12464]
+    watchTilt = tilt_angle(rows[:, 2], rows[:, 3], rows[:, 4])
+
+    # Robot: the planned arm wrestling trajectory, written by the firmware stand-in to a pty
+    all_length = int(np.ceil(len(watchTilt)/30))
+    rot, ext, sup = one_trajectory_arm_wrestling(all_length)
+    ext = np.tile(ext, 15)[:len(watchTilt)]
+    rot = 90*np.ones(len(ext))
+    sup = np.zeros(len(ext))
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    gt = EncoderGroundTruth(MAX_SIZE, fs=fs*SPEED)
+    watch = RollingSampleKurtosis(MAX_SIZE)
+    agreement = LiveAgreement(gt, watch)
+
+    stop = threading.Event()
+    reader = threading.Thread(target=read_serial, args=(os.ttyname(slave), gt, stop))
+    writer = threading.Thread(target=firmware_stand_in, args=(master, rot, ext, sup, fs, SPEED))
+    reader.start()
+    writer.start()
+
+    start = time.perf_counter()
+    for i in range(0, len(watchTilt), 10):
+        watch.push_many(watchTilt[i:i + 10].tolist())
+        time.sleep(max(0.0, start + (i + 10)/(fs*SPEED) - time.perf_counter()))
+        if i % (fs*SPEED) == 0:
+            print(agreement.report())
+
+    writer.join()
+    stop.set()
+    reader.join()
+    print(agreement.report())
@@ -0,0 +1,170 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Display-aware plotting of the long series. Every series is reduced to the horizontal resolution of the
+# figure (min/max per pixel column, or Largest-Triangle-Three-Buckets) before it is drawn, since matplotlib cannot show
+# more than a couple of points per pixel anyway. All the task/speed figures are rendered with the Agg backend in
+# parallel worker processes and saved to PNG/SVG files, so regenerating the figure set never opens a window.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import os
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VALIDATION_FOLDER = os.path.join(HERE, '..', '3_kurtosis_validation')
+TASKS = ['shuffling_cards', 'cup_stacking', 'arm_wrestling', 'handshaking', 'exploration', 'simulated_normal']
+SPEEDS = ['slow', 'fast']
+
+
+def use_agg():
+    # Headless plotting: select the Agg backend before pyplot is imported
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def minmax_decimate(x, y, nBins):
+    # Keep the minimum and the maximum of every one of nBins consecutive buckets (in their original order), so
+    # the drawn envelope is the same as with all the points
+    x, y = np.asarray(x), np.asarray(y)
+    n = len(y)
+    if n <= 2*nBins:
+        return x, y
+    k = -(-n//nBins)                                    # Samples per bucket (ceil)
+    padded = np.concatenate((y, np.full(nBins*k - n, y[-1]))).reshape(nBins, k)
+    base = np.arange(nBins)*k
+    idx = np.stack((base + padded.argmin(axis=1), base + padded.argmax(axis=1)), axis=1)
+    idx = np.unique(np.minimum(idx, n - 1))             # Sorted, without duplicates
+    return x[idx], y[idx]
+
+
+def lttb(x, y, nOut):
+    # Largest-Triangle-Three-Buckets: the first and last points are kept, and from every bucket in between the
+    # point that forms the largest triangle with the previous selected point and the mean of the next bucket
+    x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if nOut >= n or nOut < 3:
+        return x, y
+    edges = np.linspace(1, n - 1, nOut - 1).astype(int)
+    selected = np.empty(nOut, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(nOut - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            nextX, nextY = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            nextX, nextY = x[n - 1], y[n - 1]
+        area = np.abs((x[a] - nextX)*(y[lo:hi] - y[a]) - (x[a] - x[lo:hi])*(nextY - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return x[selected], y[selected]
+
+
+def decimate(x, y, pixels, method='minmax'):
+    # NaNs (e.g. the start of the kurtosis curves) are dropped, otherwise argmin/argmax would select them
+    x, y = np.asarray(x), np.asarray(y)
+    finite = np.isfinite(y)
+    if not finite.all():
+        x, y = x[finite], y[finite]
+    if method == 'lttb':
+        return lttb(x, y, 2*pixels)
+    if method == 'minmax':
+        return minmax_decimate(x, y, pixels)
+    return x, y
+
+
+def load_task(task, speed, folder=VALIDATION_FOLDER):
+    from scipy.io import loadmat
+    tilt = loadmat(os.path.join(folder, 'import_data', task + '_' + speed + '_results.mat'))
+    series = {'tilt': tilt['watch_tiltAngle_filt'].flatten()}
+    for source in ['GT', 'watch']:
+        filename = os.path.join(folder, 'exponential_decay_data', task + '_' + source + '_decay_' + speed + '.mat')
+        if not os.path.exists(filename):
+            filename = os.path.join(folder, 'exponential_decay_data', task + '_decay_' + speed + '.mat')
+        series[source] = loadmat(filename)['kurt_cut_' + source.lower() + '_' + speed].flatten()
+    return series
+
+
+def render_task(task, speed, outFolder, formats=('png',), method='minmax', fs=50, figsize=(8, 6), dpi=100):
+    # Runs in a worker process. Returns the saved files and the number of points drawn vs available
+    plt = use_agg()
+    series = load_task(task, speed)
+    pixels = int(figsize[0]*dpi)
+
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=figsize, sharex=True)
+    drawn = total = 0
+    t = np.arange(len(series['tilt']))/fs
+    tx, ty = decimate(t, series['tilt'], pixels, method)
+    ax1.plot(tx, ty, label='Watch tilt angle')
+    drawn, total = drawn + len(ty), total + len(t)
+    for source, color in [('GT', 'k'), ('watch', 'r')]:
+        t = np.arange(len(series[source]))/fs
+        kx, ky = decimate(t, series[source], pixels, method)
+        ax2.plot(kx, ky, color=color, label=source + ' kurtosis')
+        drawn, total = drawn + len(ky), total + len(t)
+
+    ax1.set_title(task + ' ' + speed)
+    ax1.set_ylabel('Degree º')
+    ax2.set_ylabel('Kurtosis')
+    ax2.set_xlabel('Time (s)')
+    ax1.legend()
+    ax2.legend()
+    ax1.grid(True)
+    ax2.grid(True)
+
+    paths = []
+    for extension in formats:
+        paths.append(os.path.join(outFolder, task + '_' + speed + '.' + extension))
+        fig.savefig(paths[-1], dpi=dpi)
+    plt.close(fig)
+    return paths, drawn, total
+
+
+def export_figures(outFolder, tasks=TASKS, speeds=SPEEDS, formats=('png',), method='minmax', workers=None):
+    from concurrent.futures import ProcessPoolExecutor
+
+    os.makedirs(outFolder, exist_ok=True)
+    jobs = [(task, speed) for task in tasks for speed in speeds]
+    with ProcessPoolExecutor(max_workers=workers, initializer=use_agg) as pool:
+        futures = [pool.submit(render_task, task, speed, outFolder, formats, method) for task, speed in jobs]
+        return [future.result() for future in futures]
+
+
+if __name__ == '__main__':
+    import timeit
+
+    for method in ['none', 'minmax', 'lttb']:
+        start_time = timeit.default_timer()
+        results = export_figures('figures_' + method, formats=('png', 'svg'), method=method)
+        elapsed = timeit.default_timer() - start_time
+        drawn = sum(result[1] for result in results)
+        total = sum(result[2] for result in results)
+        print(method, ': ', len(results), ' figures in ', round(elapsed, 2), ' s, ', drawn, ' of ', total,
+              ' points drawn')
@@ -0,0 +1,170 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Fleet batch driver. The watch sessions are discovered with a glob pattern and processed by a pool of
+# worker processes sized to the cores, largest sessions first so a long session does not start last and delay the
+# whole batch. Every worker writes the time, tilt and kurtosis series of its session straight into its slice of
+# a memory-mapped result arena (one file for the whole fleet) and only returns a small summary, so no arrays are
+# pickled back to the driver. A summary table of all the sessions is written at the end.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from long_session import OUTPUT_COLUMNS, iter_processed
+from activity_segmentation import segment_file
+
+
+def count_lines(path, blockSize=1 << 20):
+    # Upper bound of the number of samples of a session (the header line is counted too)
+    lines = 0
+    last = b'\n'
+    with open(path, 'rb') as file:
+        while True:
+            block = file.read(blockSize)
+            if not block:
+                break
+            lines += block.count(b'\n')
+            last = block[-1:]
+    return lines + (last != b'\n')
+
+
+def discover_sessions(pattern):
+    # Sessions sorted by size, largest first (the pool takes the tasks in this order)
+    import glob
+    paths = glob.glob(pattern, recursive=True)
+    return sorted(paths, key=os.path.getsize, reverse=True)
+
+
+def plan_arena(paths):
+    # Row offset and capacity of every session in the arena
+    sessions = []
+    offset = 0
+    for path in paths:
+        capacity = count_lines(path)
+        sessions.append({'path': path, 'offset': offset, 'capacity': capacity})
+        offset += capacity
+    return sessions, offset
+
+
+def open_arena(arenaPath, totalRows=None, mode='r+'):
+    if mode == 'w+':
+        return np.memmap(arenaPath, dtype='<f8', mode=mode, shape=(max(totalRows, 1), len(OUTPUT_COLUMNS)))
+    return np.memmap(arenaPath, dtype='<f8', mode=mode).reshape(-1, len(OUTPUT_COLUMNS))
+
+
+def process_session(session, arenaPath, maxSize=5000, fs=50, cutoff=1, segment=False):
+    # Runs in a worker process: the series are written in the arena, only the summary is returned.
+    # With segment=True only the experiment detected by the activity segmenter is processed
+    start_time = time.perf_counter()
+    arena = open_arena(arenaPath)
+    offset = session['offset']
+    experiment = segment_file(session['path'], fs=fs)[0] if segment else None
+    rows = 0
+    for block in iter_processed(session['path'], maxSize, fs, cutoff, segment=experiment):
+        arena[offset + rows:offset + rows + len(block)] = block
+        rows += len(block)
+    arena.flush()
+
+    kurt = arena[offset + min(maxSize, rows) - 1:offset + rows, 2]    # Once the window is full
+    start = experiment[0] if experiment is not None else 0
+    return {'path': session['path'], 'offset': offset, 'rows': rows, 'start': start, 'end': start + rows,
+            'duration_s': (arena[offset + rows - 1, 0] - arena[offset, 0])*1e-9 if rows else 0.0,
+            'kurtosis_last': float(kurt[-1]) if rows else np.nan,
+            'kurtosis_mean': float(kurt.mean()) if rows else np.nan,
+            'kurtosis_min': float(kurt.min()) if rows else np.nan,
+            'kurtosis_max': float(kurt.max()) if rows else np.nan,
+            'seconds': time.perf_counter() - start_time, 'worker': os.getpid()}
+
+
+def run_fleet(pattern, outFolder, workers=None, maxSize=5000, fs=50, cutoff=1, segment=False):
+    os.makedirs(outFolder, exist_ok=True)
+    arenaPath = os.path.join(outFolder, 'arena.f8')
+    sessions, totalRows = plan_arena(discover_sessions(pattern))
+    arena = open_arena(arenaPath, totalRows, mode='w+')     # Create the file with its final size
+    arena.flush()
+    del arena
+
+    workers = workers or os.cpu_count()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(process_session, session, arenaPath, maxSize, fs, cutoff, segment)
+                   for session in sessions]
+        for future in as_completed(futures):
+            summaries.append(future.result())
+    summaries.sort(key=lambda summary: summary['offset'])
+
+    # Index of the arena (where the series of every session are) and the summary table
+    with open(os.path.join(outFolder, 'arena.json'), 'w') as file:
+        json.dump({'columns': OUTPUT_COLUMNS, 'rows': totalRows, 'sessions': summaries}, file, indent=1)
+    with open(os.path.join(outFolder, 'summary.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(summaries[0]) if summaries else [], delimiter=';')
+        writer.writeheader()
+        writer.writerows(summaries)
+    return summaries
+
+
+def session_series(outFolder, path):
+    # (rows, 3) view of the time, tilt and kurtosis of one session of the arena
+    with open(os.path.join(outFolder, 'arena.json')) as file:
+        index = json.load(file)
+    arena = open_arena(os.path.join(outFolder, 'arena.f8'), mode='r')
+    for session in index['sessions']:
+        if session['path'] == path:
+            return arena[session['offset']:session['offset'] + session['rows']]
+    raise KeyError(path)
+
+
+if __name__ == '__main__':
+    import argparse
+    from replay_simulator import RECORDINGS
+
+    parser = argparse.ArgumentParser(description='Rolling kurtosis of every watch session with a process pool')
+    parser.add_argument('pattern', nargs='?', default=RECORDINGS, help='glob pattern of the session CSVs')
+    parser.add_argument('--out', default='fleet_results', help='output folder (arena, index and summary)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all the cores)')
+    parser.add_argument('--window', type=int, default=5000, help='kurtosis window (samples)')
+    parser.add_argument('--segment', action='store_true', help='only process the detected experiment segment')
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    summaries = run_fleet(args.pattern, args.out, args.workers, args.window, segment=args.segment)
+    elapsed = time.perf_counter() - start_time
+
+    print('{:<45} {:>8} {:>9} {:>8} {:>8} {:>7}'.format('session', 'samples', 'minutes', 'last', 'mean', 'time s'))
+    for s in summaries:
+        print('{:<45} {:>8} {:>9.1f} {:>8.3f} {:>8.3f} {:>7.2f}'.format(
+            os.path.basename(s['path'])[-45:], s['rows'], s['duration_s']/60, s['kurtosis_last'],
+            s['kurtosis_mean'], s['seconds']))
+    samples = sum(s['rows'] for s in summaries)
+    busy = sum(s['seconds'] for s in summaries)
+    print('Sessions: ', len(summaries), ' samples: ', samples, ' elapsed: ', round(elapsed, 2), ' s (',
+          round(samples/elapsed), ' samples/s, ', round(busy/elapsed, 2), ' workers busy on average)')
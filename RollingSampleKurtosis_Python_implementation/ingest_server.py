@@ -0,0 +1,332 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: asyncio ingestion service for many watches streaming at the same time. Every watch (TCP connection or UDP
+# address) gets its own session with the tilt angle and Rolling Sample Kurtosis state. The lines use the same
+# format as the recorded watch CSVs (id;time;xs;ys;zs;ac) and are decoded in batches with NumPy. TCP flow control
+# and a bounded queue per UDP session provide backpressure, and the results are flushed periodically together with
+# the sample-to-kurtosis latency of every session.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import importlib
+import time
+from collections import deque
+import numpy as np
+from rsk_engine import RollingSampleKurtosis
+
+N_FIELDS = 6    # id;time;xs;ys;zs;ac (the recorded CSVs also have a kurt column, which is ignored)
+
+
+def decode_lines(lines):
+    # Convert a batch of 'id;time;xs;ys;zs;ac[;kurt]' lines to an (n, 6) array in one NumPy conversion.
+    # Header or malformed lines are skipped
+    rows = []
+    for line in lines:
+        fields = line.strip().split(b';')
+        if len(fields) >= N_FIELDS and fields[0][:1].isdigit():
+            rows.extend(fields[:N_FIELDS])
+    if not rows:
+        return np.empty((0, N_FIELDS))
+    try:
+        return np.array(rows, dtype=np.float64).reshape(-1, N_FIELDS)
+    except ValueError:
+        # A non-numeric or empty field (e.g. a line cut off by the watch): check the rows one by one
+        valid = []
+        for i in range(0, len(rows), N_FIELDS):
+            try:
+                valid.append([float(field) for field in rows[i:i+N_FIELDS]])
+            except ValueError:
+                continue
+        return np.array(valid, dtype=np.float64).reshape(-1, N_FIELDS)
+
+
+def tilt_angle(xs, ys, zs):
+    # Tilt angle estimation (degrees) of the watch scripts, for a batch of samples
+    sq = np.sqrt(xs**2 + ys**2 + zs**2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle = np.degrees(np.arccos(np.clip(zs/sq, -1, 1)))
+    return np.nan_to_num(angle)
+
+
+class AxisFilter:
+    # Butterworth low-pass of the three accelerometer axes, with the filter state carried from one batch to the
+    # next so the batches are filtered as one continuous signal
+
+    def __init__(self, cutoff, fs=50, order=1):
+        from scipy.signal import butter, lfilter_zi
+        self.b, self.a = butter(order, cutoff, fs=fs)
+        self.zi = None
+        self._zi = lfilter_zi(self.b, self.a)
+
+    def __call__(self, xs, ys, zs):
+        from scipy.signal import lfilter
+        axes = np.vstack((xs, ys, zs))
+        if self.zi is None:
+            # Start from the steady state of the first sample, as if the watch had been still before
+            self.zi = self._zi[None, :] * axes[:, :1]
+        axes, self.zi = lfilter(self.b, self.a, axes, axis=1, zi=self.zi)
+        return axes
+
+
+class Session:
+
+    def __init__(self, sessionId, maxSize=5000, fs=50, cutoff=None, latencyWindow=1000):
+        self.sessionId = sessionId
+        self.engine = RollingSampleKurtosis(maxSize)
+        self.samples = 0
+        self.lastTime = 0
+        self.latencies = deque(maxlen=latencyWindow)
+        self.pending = deque()              # Batches waiting to be processed (UDP)
+
+        # Optional causal low-pass of the accelerometer axes (the watch scripts use a 1 Hz FFT filter offline)
+        self.filter = AxisFilter(cutoff, fs) if cutoff else None
+
+    def process(self, rows, receivedAt):
+        xs, ys, zs = rows[:, 2], rows[:, 3], rows[:, 4]
+        if self.filter is not None:
+            xs, ys, zs = self.filter(xs, ys, zs)
+
+        self.engine.push_many(tilt_angle(xs, ys, zs).tolist())
+        self.samples += len(rows)
+        self.lastTime = rows[-1, 1]
+        self.latencies.append(time.perf_counter() - receivedAt)
+
+    def summary(self):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            'session': self.sessionId,
+            'samples': self.samples,
+            'time': self.lastTime,
+            'kurtosis': self.engine.kurtosis,
+            'latency_mean_ms': 1000*latencies.mean(),
+            'latency_p99_ms': 1000*np.percentile(latencies, 99),
+            'latency_max_ms': 1000*latencies.max(),
+        }
+
+
+class _UDPProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.receive_datagram(data, addr)
+
+
+class RSKIngestServer:
+
+    def __init__(self, host='127.0.0.1', tcpPort=8750, udpPort=None, maxSize=5000, fs=50, cutoff=None,
+                 readSize=65536, maxPending=64, flushInterval=1.0, onFlush=None, idleTimeout=30.0):
+        self.host = host
+        self.tcpPort = tcpPort
+        self.udpPort = udpPort
+        self.sessionOptions = dict(maxSize=maxSize, fs=fs, cutoff=cutoff)
+        self.readSize = readSize            # Bytes read (and decoded as one batch) per TCP read
+        self.maxPending = maxPending        # Batches queued per UDP session before new ones are dropped
+        self.flushInterval = flushInterval
+        self.onFlush = onFlush or (lambda summaries: None)
+        self.idleTimeout = idleTimeout      # Seconds without datagrams after which a UDP session is closed
+
+        self.sessions = {}
+        self.dropped = 0
+        self.errors = 0                     # UDP batches that could not be processed
+        self._ready = deque()               # UDP sessions with pending batches, in arrival order
+        self._udpSeen = {}                  # Last time a datagram was received from every UDP address
+        self._tasks = []
+        self._servers = []
+        self._wakeup = None
+
+    def session(self, sessionId):
+        if sessionId not in self.sessions:
+            self.sessions[sessionId] = Session(sessionId, **self.sessionOptions)
+        return self.sessions[sessionId]
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        if self.sessionOptions['cutoff']:
+            # Load it now, not when the first watch connects and is already sending
+            importlib.import_module('scipy.signal')
+        if self.tcpPort is not None:
+            server = await asyncio.start_server(self.handle_tcp, self.host, self.tcpPort, limit=self.readSize)
+            self.tcpPort = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+        if self.udpPort is not None:
+            transport, _ = await loop.create_datagram_endpoint(lambda: _UDPProtocol(self),
+                                                               local_addr=(self.host, self.udpPort))
+            self.udpPort = transport.get_extra_info('sockname')[1]
+            self._servers.append(transport)
+            self._tasks.append(asyncio.create_task(self.process_udp()))
+        self._tasks.append(asyncio.create_task(self.flush_periodically()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for server in self._servers:
+            server.close()
+        self.flush()
+
+    async def handle_tcp(self, reader, writer):
+        # One session per connection. The next chunk is only read after the previous one has been processed, so
+        # a slow server makes the TCP window fill up and the watch slows down (backpressure)
+        sessionId = writer.get_extra_info('peername')
+        session = self.session(sessionId)
+        remainder = b''
+        try:
+            while True:
+                chunk = await reader.read(self.readSize)
+                if not chunk:
+                    # The last line may not end with a newline
+                    rows = decode_lines([remainder])
+                    if len(rows):
+                        session.process(rows, time.perf_counter())
+                    break
+                receivedAt = time.perf_counter()
+                lines = (remainder + chunk).split(b'\n')
+                remainder = lines.pop()
+                rows = decode_lines(lines)
+                if len(rows):
+                    session.process(rows, receivedAt)
+                await asyncio.sleep(0)      # Let the other sessions run
+        finally:
+            writer.close()
+            # Report the session one last time and forget it (the next connection has a new peername)
+            self.flush([session])
+            self.sessions.pop(sessionId, None)
+
+    def receive_datagram(self, data, addr):
+        session = self.session(addr)
+        receivedAt = time.perf_counter()
+        self._udpSeen[addr] = receivedAt
+        if len(session.pending) >= self.maxPending:
+            self.dropped += 1
+            return
+        if not session.pending:
+            self._ready.append(session)
+        session.pending.append((data, receivedAt))
+        self._wakeup.set()
+
+    async def process_udp(self):
+        # Only the sessions with pending batches are visited, so a datagram costs O(1) whatever the number of
+        # sessions
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._ready:
+                session = self._ready.popleft()
+                while session.pending:
+                    data, receivedAt = session.pending.popleft()
+                    try:
+                        rows = decode_lines(data.split(b'\n'))
+                        if len(rows):
+                            session.process(rows, receivedAt)
+                    except Exception as exc:
+                        # A bad batch must not stop the processing of the other sessions
+                        self.errors += 1
+                        print('Session %s: batch dropped (%r)' % (session.sessionId, exc))
+                await asyncio.sleep(0)
+
+    async def flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flushInterval)
+            self.flush()
+            self.expire_idle()
+
+    def expire_idle(self, now=None):
+        # Close the UDP sessions that have not sent anything for idleTimeout seconds
+        if now is None:
+            now = time.perf_counter()
+        idle = [addr for addr, seen in self._udpSeen.items()
+                if now - seen > self.idleTimeout and not self.sessions[addr].pending]
+        if idle:
+            self.flush([self.sessions[addr] for addr in idle])
+            for addr in idle:
+                del self._udpSeen[addr]
+                del self.sessions[addr]
+
+    def flush(self, sessions=None):
+        if sessions is None:
+            sessions = self.sessions.values()
+        self.onFlush([session.summary() for session in sessions])
+
+
+async def stand_in_client(host, port, rows, fs=50, speed=1.0, batch=10, udp=False):
+    # Local stand-in for a watch: sends the rows of a recorded CSV in batches at fs*speed samples per second
+    lines = [';'.join(str(v) for v in row).encode() for row in rows]
+    period = batch/(fs*speed)
+    loop = asyncio.get_running_loop()
+    if udp:
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        send = transport.sendto
+    else:
+        _, writer = await asyncio.open_connection(host, port)
+        send = writer.write
+
+    start = loop.time()
+    for i in range(0, len(lines), batch):
+        send(b'\n'.join(lines[i:i + batch]) + b'\n')
+        if not udp:
+            await writer.drain()
+        await asyncio.sleep(max(0, start + (i//batch + 1)*period - loop.time()))
+
+    if udp:
+        transport.close()
+    else:
+        writer.close()
+        await writer.wait_closed()
+
+
+if __name__ == '__main__':
+    import sys
+
+    N_WATCHES = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    SPEED = 10      # Replay the recording 10 times faster than real time
+
+    with open('../2_watch_data_processing/arm_wrestling/_arm_wrestling_slow_v1_watchData.csv', 'rb') as file:
+        recording = decode_lines(file.read().split(b'\n'))[:3000]
+
+    latest = {}     # Last summary of every session, including the ones already closed
+
+    def record_summary(summaries):
+        for s in summaries:
+            latest[s['session']] = s
+
+    async def run():
+        server = RSKIngestServer(tcpPort=0, onFlush=record_summary)
+        await server.start()
+        await asyncio.gather(*[stand_in_client('127.0.0.1', server.tcpPort, recording, speed=SPEED)
+                               for _ in range(N_WATCHES)])
+        await server.stop()
+        return server
+
+    server = asyncio.run(run())
+    latency = np.array([s['latency_p99_ms'] for s in latest.values()])
+    print('sessions: ', len(latest), ' samples: ', sum(s['samples'] for s in latest.values()),
+          ' p99 latency (ms) median/max: ', np.median(latency), latency.max(), ' open sessions left: ',
+          len(server.sessions))
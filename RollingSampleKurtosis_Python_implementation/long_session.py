@@ -0,0 +1,177 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Long-session (out-of-core) processing for multi-hour patient recordings. The watch CSV is read in
+# chunks of rows, the accelerometer axes are low-pass filtered with the filter state carried between chunks, and the
+# tilt angle and the rolling kurtosis of every chunk are appended to a chunked binary file on disk. Only one chunk is
+# in memory at any time, so the peak memory is the same for a 5 minute or a 24 hour session.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import struct
+from itertools import islice
+import numpy as np
+from rsk_engine import RollingSampleKurtosis
+from ingest_server import AxisFilter, decode_lines, tilt_angle
+
+OUTPUT_MAGIC = b'RSKC'
+OUTPUT_VERSION = 1
+OUTPUT_HEADER = struct.Struct('<4sBxxxIQ')     # magic, version, number of columns, number of rows
+OUTPUT_COLUMNS = ('time', 'tilt', 'kurtosis')
+
+
+class ChunkedOutput:
+    # Binary file with a fixed header followed by float64 rows, appended chunk by chunk. The number of rows in
+    # the header is updated when the file is closed
+
+    def __init__(self, path, columns=len(OUTPUT_COLUMNS)):
+        self.columns = columns
+        self.rows = 0
+        self.file = open(path, 'wb')
+        self.file.write(OUTPUT_HEADER.pack(OUTPUT_MAGIC, OUTPUT_VERSION, columns, 0))
+
+    def append(self, block):
+        block = np.asarray(block, dtype='<f8')
+        if block.ndim != 2 or block.shape[1] != self.columns:
+            raise ValueError('expected a block with ' + str(self.columns) + ' columns')
+        self.file.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(OUTPUT_HEADER.pack(OUTPUT_MAGIC, OUTPUT_VERSION, self.columns, self.rows))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_output(path):
+    # Memory-mapped (rows, columns) view of a chunked output file, nothing is loaded until it is indexed
+    with open(path, 'rb') as file:
+        magic, version, columns, rows = OUTPUT_HEADER.unpack(file.read(OUTPUT_HEADER.size))
+    if magic != OUTPUT_MAGIC or version != OUTPUT_VERSION:
+        raise ValueError('not a chunked RSK output file')
+    return np.memmap(path, dtype='<f8', mode='r', offset=OUTPUT_HEADER.size, shape=(rows, columns))
+
+
+def iter_chunks(file, chunkRows=16384):
+    # Decoded (n, 6) row arrays of at most chunkRows lines of a watch CSV opened in binary mode
+    while True:
+        lines = list(islice(file, chunkRows))
+        if not lines:
+            return
+        rows = decode_lines(lines)
+        if len(rows):
+            yield rows
+
+
+def iter_processed(path, maxSize=5000, fs=50, cutoff=1, chunkRows=16384, engine=None, segment=None):
+    # (n, 3) blocks with the time, tilt angle and rolling kurtosis of every sample, one chunk at a time.
+    # With segment=(start, end) only those samples are processed (e.g. the experiment found by
+    # activity_segmentation.segment_file). The samples before it are still filtered, like the watch scripts that
+    # filter the whole recording and then cut it
+    if engine is None:
+        engine = RollingSampleKurtosis(maxSize)
+    start, end = segment if segment is not None else (0, None)
+    axisFilter = AxisFilter(cutoff, fs) if cutoff else None
+    first = 0       # Index of the first sample of the chunk
+    with open(path, 'rb') as file:
+        for rows in iter_chunks(file, chunkRows):
+            if end is not None and first >= end:
+                return
+            xs, ys, zs = rows[:, 2], rows[:, 3], rows[:, 4]
+            if axisFilter is not None:
+                xs, ys, zs = axisFilter(xs, ys, zs)
+            i, j = max(start - first, 0), len(rows) if end is None else min(end - first, len(rows))
+            first += len(rows)
+            if i >= j:
+                continue
+            rows, xs, ys, zs = rows[i:j], xs[i:j], ys[i:j], zs[i:j]
+            tilt = tilt_angle(xs, ys, zs)
+
+            kurt = np.empty(len(tilt))
+            push = engine.push
+            for i, value in enumerate(tilt.tolist()):
+                push(value)
+                kurt[i] = engine.kurtosis
+            yield np.column_stack((rows[:, 1], tilt, kurt))
+
+
+def process_long_session(path, outPath, maxSize=5000, fs=50, cutoff=1, chunkRows=16384, segment=None):
+    engine = RollingSampleKurtosis(maxSize)
+    chunks = 0
+    with ChunkedOutput(outPath) as out:
+        for block in iter_processed(path, maxSize, fs, cutoff, chunkRows, engine, segment):
+            out.append(block)
+            chunks += 1
+    return {'samples': out.rows, 'chunks': chunks, 'kurtosis': engine.kurtosis}
+
+
+if __name__ == '__main__':
+    import importlib
+    import os
+    import tempfile
+    import timeit
+    import tracemalloc
+    # Imported before measuring, so only the processing is traced
+    importlib.import_module('scipy.signal')
+    from replay_simulator import RECORDINGS
+
+    recording = os.path.join(os.path.dirname(os.path.dirname(RECORDINGS)), 'arm_wrestling',
+                             '_arm_wrestling_slow_v1_watchData.csv')
+    with open(recording, 'rb') as file:
+        header = file.readline()
+        body = file.readlines()
+
+    folder = tempfile.mkdtemp()
+    for minutes in [5, 30, 120]:
+        # Long session made by repeating the recording (written line by line, not built in memory)
+        path = os.path.join(folder, 'session_' + str(minutes) + 'min.csv')
+        with open(path, 'wb') as file:
+            file.write(header)
+            for i in range(minutes*60*50):
+                file.write(body[i % len(body)])
+
+        tracemalloc.start()
+        start_time = timeit.default_timer()
+        result = process_long_session(path, path[:-4] + '.rskc')
+        elapsed = timeit.default_timer() - start_time
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        output = read_output(path[:-4] + '.rskc')
+        print(minutes, 'min: ', result['samples'], ' samples in ', result['chunks'], ' chunks, ', round(elapsed, 2),
+              ' s, peak memory ', round(peak/2**20, 1), ' MB, last kurtosis ', output[-1, 2])
+        os.remove(path)
+        os.remove(path[:-4] + '.rskc')
+    os.rmdir(folder)
@@ -0,0 +1,172 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Multi-resolution moment pyramid for day-long and multi-day recordings. Every sample is added to the open
+# 10 s bucket; when a bucket closes, its (n, mean, M2, M3, M4) summary is stored and merged exactly into the open bucket
+# of the next level (1 min, 10 min, 1 h). The kurtosis of any time range is obtained by covering it with the
+# coarsest buckets that fit and the finer buckets at the edges, without going back to the raw samples.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+from bisect import bisect_left, bisect_right
+from rsk_engine import add_sample, merge_moments
+from range_index import shape_statistics
+
+LEVELS = (10, 60, 600, 3600)  # Bucket length of every level, in seconds
+EMPTY = (0, 0.0, 0.0, 0.0, 0.0)
+
+
+class MomentPyramid:
+
+    def __init__(self, engine=None, levels=LEVELS, timeScale=1e-9, retention=None):
+        # Every level must be a whole multiple of the previous one, so its buckets are made of complete children
+        for fine, coarse in zip(levels, levels[1:]):
+            if coarse % fine != 0:
+                raise ValueError('every level must be a multiple of the previous one')
+        self.engine = engine
+        self.levels = tuple(levels)
+        self.timeScale = timeScale
+        # Maximum number of closed buckets kept per level (None keeps everything)
+        if retention is not None and not isinstance(retention, (tuple, list)):
+            retention = (retention,)*len(levels)
+        self.retention = retention
+
+        self.starts = [[] for _ in levels]           # Start time (s) of the closed buckets
+        self.summaries = [[] for _ in levels]        # (n, mean, M2, M3, M4) of the closed buckets
+        self.openIndex = [None]*len(levels)          # Index (start/length) of the open bucket of every level
+        self.openSummary = [EMPTY]*len(levels)
+        self.lastTime = None
+
+    def push(self, timestamp, newValue):
+        if self.engine is not None:
+            self.engine.push(newValue)
+        t = timestamp*self.timeScale
+        index = int(t//self.levels[0])
+        if index != self.openIndex[0]:
+            self.close(0)
+            self.openIndex[0] = index
+        self.openSummary[0] = add_sample(*self.openSummary[0], newValue)
+        self.lastTime = t
+
+    def push_many(self, timestamps, values):
+        for timestamp, value in zip(timestamps, values):
+            self.push(timestamp, value)
+
+    def close(self, level):
+        # Store the open bucket of a level and merge it into the open bucket of the next level
+        if self.openIndex[level] is None or self.openSummary[level][0] == 0:
+            return
+        start = self.openIndex[level]*self.levels[level]
+        summary = self.openSummary[level]
+        self.starts[level].append(start)
+        self.summaries[level].append(summary)
+        self.openIndex[level] = None
+        self.openSummary[level] = EMPTY
+
+        retention = None if self.retention is None else self.retention[level]
+        if retention is not None and len(self.starts[level]) >= 2*retention:
+            # Drop the oldest buckets in bulk so trimming is amortized O(1)
+            del self.starts[level][:-retention]
+            del self.summaries[level][:-retention]
+
+        if level + 1 < len(self.levels):
+            index = int(start//self.levels[level + 1])
+            if index != self.openIndex[level + 1]:
+                self.close(level + 1)
+                self.openIndex[level + 1] = index
+            self.openSummary[level + 1] = merge_moments(*self.openSummary[level + 1], *summary)
+
+    def flush(self):
+        # Close every open bucket (e.g. at the end of a recording)
+        for level in range(len(self.levels)):
+            self.close(level)
+
+    def summary(self, t0, t1):
+        # Merged (n, mean, M2, M3, M4) of the buckets inside [t0, t1), in seconds. The range is resolved to the
+        # finest level, and the samples of the open 10 s bucket are included when it starts inside the range
+        result = self.cover(len(self.levels) - 1, t0, t1)
+        if self.openIndex[0] is not None and self.lastTime < t1:
+            if self.openIndex[0]*self.levels[0] >= t0:
+                result = merge_moments(*result, *self.openSummary[0])
+        return result
+
+    def cover(self, level, t0, t1):
+        if t1 <= t0:
+            return EMPTY
+        length = self.levels[level]
+        starts = self.starts[level]
+        i = bisect_left(starts, t0)
+        j = bisect_right(starts, t1 - length)   # Buckets that are completely inside the range
+        if i >= j:
+            return EMPTY if level == 0 else self.cover(level - 1, t0, t1)
+
+        result = EMPTY
+        for summary in self.summaries[level][i:j]:
+            result = merge_moments(*result, *summary)
+        if level > 0:
+            result = merge_moments(*result, *self.cover(level - 1, t0, starts[i]))
+            result = merge_moments(*result, *self.cover(level - 1, starts[j - 1] + length, t1))
+        return result
+
+    def stats(self, t0, t1):
+        # (n, mean, variance, skewness, kurtosis) of the samples in [t0, t1)
+        return shape_statistics(*self.summary(t0, t1))
+
+    def kurtosis(self, t0, t1):
+        return self.stats(t0, t1)[4]
+
+    def series(self, level):
+        # Start time and kurtosis of every closed bucket of a level (e.g. the kurtosis every 10 minutes)
+        return self.starts[level], [shape_statistics(*summary)[4] for summary in self.summaries[level]]
+
+
+if __name__ == '__main__':
+    import timeit
+    import numpy as np
+    from scipy.stats import kurtosis
+
+    # One day of simulated 50 Hz tilt angles
+    fs = 50
+    rng = np.random.default_rng(0)
+    timestamps = np.arange(24*3600*fs)*(1e9/fs)
+    values = 90 + 30*np.sin(2*np.pi*0.2*timestamps*1e-9) + rng.normal(0, 5, len(timestamps))
+
+    pyramid = MomentPyramid()
+    start_time = timeit.default_timer()
+    pyramid.push_many(timestamps[:fs*3600], values[:fs*3600])
+    print('One hour of samples pushed in ', timeit.default_timer() - start_time, ' s')
+    pyramid.push_many(timestamps[fs*3600:], values[fs*3600:])
+    pyramid.flush()
+
+    for level, length in enumerate(pyramid.levels):
+        print(length, 's buckets: ', len(pyramid.starts[level]))
+
+    t0, t1 = 2*3600 + 130, 20*3600 + 3590
+    start_time = timeit.default_timer()
+    k = pyramid.kurtosis(t0, t1)
+    print('Kurtosis of [', t0, ', ', t1, ') s: ', k, ' in ', (timeit.default_timer() - start_time)*1000, ' ms')
+    print('Using scipy.stats: ', kurtosis(values[t0*fs:t1*fs], fisher=False))
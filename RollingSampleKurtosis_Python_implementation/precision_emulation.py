@@ -0,0 +1,200 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Emulation of the Rolling Sample Kurtosis equations in the numeric formats available on the watch. The
+# same recurrences as rolling_kurtosis() in main.py are evaluated rounding every operation to float32 or to a
+# fixed-point format, next to a float64 shadow. The errors, the cancellation events in the variance update
+# (which is squared in newM2 * newM2) and the operations per sample are then reported with NumPy.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import numpy as np
+
+
+class Quantizer:
+    # Rounds the result of every operation to the emulated format and counts the operations
+    def __init__(self, mode='float32', fracBits=16, wordBits=32):
+        self.mode = mode
+        self.ops = 0
+        self.saturations = 0
+        if mode == 'fixed':
+            self.scale = 2.0**fracBits
+            self.high = 2.0**(wordBits - 1) - 1
+            self.low = -2.0**(wordBits - 1)
+        elif mode not in ('float32', 'float64'):
+            raise ValueError('mode must be float64, float32 or fixed')
+
+    def __call__(self, value):
+        self.ops += 1
+        if self.mode == 'float32':
+            return np.float32(value)
+        if self.mode == 'float64':
+            return float(value)
+        r = round(float(value)*self.scale)
+        if r > self.high or r < self.low:
+            self.saturations += 1
+            r = min(max(r, self.low), self.high)
+        return r/self.scale
+
+
+def rolling_step(q, newValue, poppedValue, _iter, maxSize, _mean, _M2, _M3, _M4):
+    # rolling_kurtosis() with every operation rounded by q. Returns the new moments, the kurtosis and the two
+    # operands of the variance update (to detect the cancellation)
+
+    # Add first value
+    if _iter == 1 and poppedValue is None:
+        z = q(0)
+        return q(newValue), z, z, z, z, z, z
+
+    # Buffer is not full, apply incremental approach
+    if poppedValue is None:
+        delta = q(newValue - _mean)
+        delta_n = q(delta/_iter)
+        delta_n2 = q(delta_n*delta_n)
+        term1 = q(q(delta*delta_n)*(_iter - 1))
+
+        newMean = q(_mean + delta_n)
+        dif1 = q(newValue - newMean)
+        dif2 = q(newMean - _mean)
+
+        update = q(dif1*q(newValue - _mean))
+        newM2 = q(_M2 + update)
+        newM3 = q(q(_M3 - q(q(3*dif2)*_M2)) + q(q(newM2 - _M2)*q(dif1 - dif2)))
+        newM4 = q(q(q(_M4 + q(q(term1*delta_n2)*(_iter*_iter - 3*_iter + 3))) + q(q(6*delta_n2)*_M2))
+                  - q(q(4*delta_n)*_M3))
+        n = _iter
+
+    # Buffer is full. Apply Rolling Approach
+    else:
+        dif3 = q(newValue - poppedValue)
+        newMean = q(_mean + q(dif3/maxSize))
+
+        dif4 = q(poppedValue - newMean)
+        dif5 = q(newValue - newMean)
+        dif6 = q(newMean - _mean)
+        dif7 = q(poppedValue - _mean)
+        sum1 = q(dif4 + dif5)
+
+        update = q(dif3*q(dif5 + dif7))
+        newM2 = q(_M2 + update)
+        newM3 = q(q(_M3 - q(q(3*dif6)*_M2)) + q(dif3*q(q(dif7*q(dif4 - dif6)) + q(dif5*sum1))))
+        dif6_2 = q(dif6*dif6)
+        newM4 = q(q(q(_M4 - q(q(4*dif6)*_M3)) + q(q(6*dif6_2)*_M2))
+                  + q(dif3*q(q(dif6*dif6_2) + q(sum1*q(q(dif5*dif5) + q(dif4*dif4))))))
+        n = maxSize
+
+    denominator = q(newM2*newM2)
+    _kurtosis = q(q(n*newM4)/denominator) if denominator != 0 else q(0)
+    return newMean, newM2, newM3, newM4, _kurtosis, _M2, update
+
+
+class EmulatedRSK:
+    # Runs the emulated format and the float64 shadow on the same stream
+
+    def __init__(self, maxSize, mode='float32', fracBits=16, wordBits=32, cancellationBits=12):
+        self.maxSize = maxSize
+        self.q = Quantizer(mode, fracBits, wordBits)
+        self.shadow = Quantizer('float64')
+        self.cancellationBits = cancellationBits  # Bits lost in the variance update to count as an event
+
+    def run(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        N = len(values)
+        kurt = np.zeros(N)
+        kurt64 = np.zeros(N)
+        M2 = np.zeros(N)
+        M2_64 = np.zeros(N)
+        operands = np.zeros((N, 2))
+
+        q, q64 = self.q, self.shadow
+        buffer = [None]*self.maxSize
+        state = (q(0), q(0), q(0), q(0))
+        state64 = (0.0, 0.0, 0.0, 0.0)
+        _iter, currentIndex = 0, 0
+        for i, newValue in enumerate(values):
+            # Simulate that a new value is received by the sensor (see simulate_onSensorChanged() in main.py)
+            poppedValue = None
+            if _iter < self.maxSize:
+                _iter += 1
+            else:
+                poppedValue = buffer[currentIndex]
+            buffer[currentIndex] = newValue
+            currentIndex = (currentIndex + 1) % self.maxSize
+
+            popped_q = None if poppedValue is None else q(poppedValue)
+            out = rolling_step(q, q(newValue), popped_q, _iter, self.maxSize, *state)
+            out64 = rolling_step(q64, newValue, poppedValue, _iter, self.maxSize, *state64)
+            state, kurt[i], operands[i] = out[:4], out[4], out[5:]
+            state64, kurt64[i] = out64[:4], out64[4]
+            M2[i], M2_64[i] = state[1], state64[1]
+
+        return self.report(values, kurt, kurt64, M2, M2_64, operands)
+
+    def report(self, values, kurt, kurt64, M2, M2_64, operands):
+        N = len(values)
+        error = kurt - kurt64
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relError = np.abs(error)/np.abs(kurt64)
+            # Bits lost in newM2 = _M2 + update: log2 of the largest operand over the result
+            lostBits = np.log2(np.max(np.abs(operands), axis=1)/np.abs(M2))
+            M2Error = np.abs(M2 - M2_64)/np.abs(M2_64)
+        lostBits[~np.isfinite(lostBits)] = 0
+        cancellation = lostBits >= self.cancellationBits
+        full = np.arange(N) >= self.maxSize - 1
+
+        return {
+            'kurtosis': kurt,
+            'kurtosis_float64': kurt64,
+            'max_abs_error': np.nanmax(np.abs(error)),
+            'max_rel_error': np.nanmax(relError[full]) if full.any() else np.nanmax(relError),
+            'final_abs_error': abs(error[-1]),
+            # Drift: how much the error grows while rolling, after the buffer is full
+            'drift': abs(error[-1]) - abs(error[self.maxSize - 1]) if N >= self.maxSize else 0,
+            'M2_rel_error': np.nanmax(M2Error),
+            'cancellation_events': int(np.count_nonzero(cancellation)),
+            'max_lost_bits': lostBits.max(),
+            'zero_variance_events': int(np.count_nonzero((M2 == 0) & (M2_64 != 0))),
+            'saturation_events': self.q.saturations,
+            'ops_per_sample': self.q.ops/N,
+        }
+
+
+if __name__ == '__main__':
+    import json
+
+    MAX_SIZE = 5000
+
+    with open("data_10000.json", "r") as file:
+        SIM_SENSOR_VALUES = json.load(file)
+
+    # float32, Q15.16 (32 bits) and Q31.32 (64 bits)
+    for mode, fracBits, wordBits in [('float32', 0, 0), ('fixed', 16, 32), ('fixed', 32, 64)]:
+        report = EmulatedRSK(MAX_SIZE, mode, fracBits, wordBits).run(SIM_SENSOR_VALUES)
+        print(mode, 'Q{}.{}'.format(wordBits - fracBits - 1, fracBits) if mode == 'fixed' else '')
+        for key, value in report.items():
+            if not isinstance(value, np.ndarray):
+                print('    ', key, ': ', value)
@@ -0,0 +1,186 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Range queries over a recorded session. Instead of recomputing the kurtosis from scratch for every slice
+# (filtered_accel_angle[2046:12464], per-repetition segments, ...), the session is indexed once and the variance,
+# skewness and kurtosis of any [a, b) index range or [t0, t1) time range are obtained from:
+#  - PrefixMomentIndex: prefix sums of the powers of the values shifted by the session mean, O(1) per query.
+#  - SegmentTreeIndex: a segment tree of mergeable (n, mean, M2, M3, M4) summaries, O(log n) per query and
+#    numerically stable for long sessions with a large offset.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from rsk_engine import merge_moments
+
+
+def shape_statistics(n, mean, M2, M3, M4):
+    # (n, mean, variance, skewness, kurtosis) from the central moment sums, with the same definitions as the
+    # RSK engine (population variance, Pearson kurtosis)
+    if n == 0:
+        return 0, 0, 0, 0, 0
+    if M2 <= 0:
+        return n, mean, 0, 0, 0
+    return n, mean, M2/n, n**0.5*M3/M2**1.5, n*M4/(M2*M2)
+
+
+class _RangeIndex:
+
+    def __init__(self, values, timestamps=None):
+        self.values = np.asarray(values, dtype=np.float64)
+        self.timestamps = None if timestamps is None else np.asarray(timestamps)
+
+    def index_range(self, t0, t1):
+        # [a, b) indexes of the samples with t0 <= time < t1
+        if self.timestamps is None:
+            raise ValueError('the index was built without timestamps')
+        return (int(np.searchsorted(self.timestamps, t0, side='left')),
+                int(np.searchsorted(self.timestamps, t1, side='left')))
+
+    def stats(self, a, b):
+        return shape_statistics(*self.moments(a, b))
+
+    def time_stats(self, t0, t1):
+        return self.stats(*self.index_range(t0, t1))
+
+    def variance(self, a, b):
+        return self.stats(a, b)[2]
+
+    def skewness(self, a, b):
+        return self.stats(a, b)[3]
+
+    def kurtosis(self, a, b):
+        return self.stats(a, b)[4]
+
+
+class PrefixMomentIndex(_RangeIndex):
+
+    def __init__(self, values, timestamps=None):
+        super().__init__(values, timestamps)
+        # Shifting by the mean of the session keeps the power sums small, which limits the cancellation
+        self.shift = self.values.mean() if len(self.values) else 0.0
+        z = self.values - self.shift
+        self.prefix = np.zeros((5, len(z) + 1))
+        self.prefix[0, 1:] = np.arange(1, len(z) + 1)
+        self.prefix[1, 1:] = np.cumsum(z)
+        self.prefix[2, 1:] = np.cumsum(z*z)
+        self.prefix[3, 1:] = np.cumsum(z*z*z)
+        self.prefix[4, 1:] = np.cumsum(z*z*z*z)
+
+    def moments(self, a, b):
+        a, b = max(a, 0), min(b, len(self.values))
+        if b <= a:
+            return 0, 0, 0, 0, 0
+        n, S1, S2, S3, S4 = self.prefix[:, b] - self.prefix[:, a]
+        n = int(round(n))
+        d = S1/n
+        M2 = S2 - d*S1
+        M3 = S3 - 3*d*S2 + 2*d*d*S1
+        M4 = S4 - 4*d*S3 + 6*d*d*S2 - 3*d*d*d*S1
+        return n, d + self.shift, M2, M3, M4
+
+    def kurtosis_many(self, a, b):
+        # Kurtosis of many ranges at once (a and b are arrays of indexes)
+        a = np.clip(np.asarray(a), 0, len(self.values))
+        b = np.clip(np.asarray(b), 0, len(self.values))
+        n, S1, S2, S3, S4 = self.prefix[:, b] - self.prefix[:, a]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            d = S1/n
+            M2 = S2 - d*S1
+            M4 = S4 - 4*d*S3 + 6*d*d*S2 - 3*d*d*d*S1
+            kurt = n*M4/(M2*M2)
+        return np.where(M2 > 0, kurt, 0)
+
+
+class SegmentTreeIndex(_RangeIndex):
+
+    def __init__(self, values, timestamps=None):
+        super().__init__(values, timestamps)
+        N = len(self.values)
+        self.size = 1
+        while self.size < N:
+            self.size *= 2
+
+        # Node i has children 2i and 2i+1, leaves are at [size, 2*size). Empty leaves have n = 0
+        self.n = np.zeros(2*self.size)
+        self.mean = np.zeros(2*self.size)
+        self.M2 = np.zeros(2*self.size)
+        self.M3 = np.zeros(2*self.size)
+        self.M4 = np.zeros(2*self.size)
+        self.n[self.size:self.size + N] = 1
+        self.mean[self.size:self.size + N] = self.values
+
+        # Build every level at once, from the leaves to the root
+        level = self.size
+        while level > 1:
+            parents = np.arange(level//2, level)
+            left, right = 2*parents, 2*parents + 1
+            (self.n[parents], self.mean[parents], self.M2[parents], self.M3[parents],
+             self.M4[parents]) = merge_moments(self.n[left], self.mean[left], self.M2[left], self.M3[left],
+                                               self.M4[left], self.n[right], self.mean[right], self.M2[right],
+                                               self.M3[right], self.M4[right])
+            level //= 2
+
+    def node(self, i):
+        return self.n[i], self.mean[i], self.M2[i], self.M3[i], self.M4[i]
+
+    def moments(self, a, b):
+        # Merge the O(log n) nodes that cover [a, b)
+        a, b = max(a, 0) + self.size, min(b, len(self.values)) + self.size
+        result = (0, 0.0, 0.0, 0.0, 0.0)
+        while a < b:
+            if a & 1:
+                result = merge_moments(*result, *self.node(a))
+                a += 1
+            if b & 1:
+                b -= 1
+                result = merge_moments(*result, *self.node(b))
+            a //= 2
+            b //= 2
+        n, mean, M2, M3, M4 = result
+        return int(n), float(mean), float(M2), float(M3), float(M4)
+
+
+if __name__ == '__main__':
+    import timeit
+    from scipy.io import loadmat
+    from scipy.stats import kurtosis
+
+    data = loadmat('../3_kurtosis_validation/import_data/simulated_normal_slow_results.mat')
+    tilt = data['watch_tiltAngle_filt'].flatten()
+    repetition = len(tilt)//15
+
+    start_time = timeit.default_timer()
+    prefix = PrefixMomentIndex(tilt)
+    tree = SegmentTreeIndex(tilt)
+    print('Index built in ', (timeit.default_timer() - start_time)*1000, ' ms')
+
+    print('Whole session: ', prefix.kurtosis(0, len(tilt)), tree.kurtosis(0, len(tilt)),
+          kurtosis(tilt, fisher=False))
+    starts = np.arange(15)*repetition
+    print('Per repetition (prefix): ', prefix.kurtosis_many(starts, starts + repetition))
+    print('Per repetition (tree):   ', np.array([tree.kurtosis(a, a + repetition) for a in starts]))
@@ -0,0 +1,140 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Paced replay of the recorded watch sessions (_*_watchData.csv). Every virtual watch sends its samples at
+# the times given by the time column of the recording, in real time or N times faster, and hundreds of them are
+# multiplexed with asyncio into per-watch kurtosis sessions. The end-to-end latency (from the moment a sample is
+# due to the moment the kurtosis includes it) and the CPU time per stream are measured for capacity planning.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import asyncio
+import glob
+import os
+import time
+import numpy as np
+from ingest_server import Session, decode_lines
+
+RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '2_watch_data_processing', '*',
+                          '_*_watchData.csv')
+
+
+def load_recording(path):
+    with open(path, 'rb') as file:
+        return decode_lines(file.read().split(b'\n'))
+
+
+class VirtualWatch:
+
+    def __init__(self, watchId, rows, speed=1.0, maxSize=5000, duration=None):
+        self.rows = rows
+        self.speed = speed
+        self.session = Session(watchId, maxSize=maxSize)
+
+        # Seconds after the start at which every sample is due, from the nanosecond time column
+        self.due = (rows[:, 1] - rows[0, 1])*1e-9/speed
+        if duration is not None:
+            n = np.searchsorted(self.due, duration)
+            self.rows, self.due = self.rows[:n], self.due[:n]
+
+        self.cpu = 0.0
+        self.maxLatency = 0.0
+        self.latencySum = 0.0
+
+    async def run(self, start, offset=0.0):
+        loop = asyncio.get_running_loop()
+        i, n = 0, len(self.rows)
+        while i < n:
+            # Sleep until the next sample is due, then send every sample that is already due as one batch
+            await asyncio.sleep(max(0.0, start + offset + self.due[i] - loop.time()))
+            now = loop.time() - start - offset
+            j = np.searchsorted(self.due, now, side='right')
+            j = max(j, i + 1)
+
+            dueAt = time.perf_counter() - (now - self.due[i])     # perf_counter time when rows[i] was due
+            cpu = time.thread_time()
+            self.session.process(self.rows[i:j], dueAt)
+            self.cpu += time.thread_time() - cpu
+
+            # latency is the one of rows[i] (the oldest of the batch); every later sample was due later
+            latency = self.session.latencies[-1]
+            self.maxLatency = max(self.maxLatency, latency)
+            self.latencySum += np.sum(latency - (self.due[i:j] - self.due[i]))
+            i = j
+
+    def summary(self, elapsed):
+        samples = self.session.samples
+        return {
+            'watch': self.session.sessionId,
+            'samples': samples,
+            'kurtosis': self.session.engine.kurtosis,
+            'latency_mean_ms': 1000*self.latencySum/max(samples, 1),
+            'latency_max_ms': 1000*self.maxLatency,
+            'cpu_us_per_sample': 1e6*self.cpu/max(samples, 1),
+            'cpu_percent_of_core': 100*self.cpu/elapsed,
+        }
+
+
+async def replay(paths, watches=100, speed=1.0, duration=None, maxSize=5000, seed=0):
+    # Multiplex `watches` virtual watches, cycling over the recordings, with random start offsets (up to one
+    # second) so that they do not all send at the same instant
+    recordings = [load_recording(path) for path in paths]
+    rng = np.random.default_rng(seed)
+    fleet = [VirtualWatch(w, recordings[w % len(recordings)], speed, maxSize, duration) for w in range(watches)]
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    cpu = time.process_time()
+    await asyncio.gather(*[watch.run(start, rng.uniform(0, 1)) for watch in fleet])
+    elapsed = loop.time() - start
+    cpu = time.process_time() - cpu
+    return [watch.summary(elapsed) for watch in fleet], elapsed, cpu
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Paced replay of the recorded watch sessions')
+    parser.add_argument('--watches', type=int, default=100, help='number of virtual watches')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed (N times real time)')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of replay (after the speed-up)')
+    parser.add_argument('--window', type=int, default=5000, help='kurtosis window (samples)')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(RECORDINGS))
+    summaries, elapsed, cpu = asyncio.run(replay(paths, args.watches, args.speed, args.duration, args.window))
+
+    samples = sum(s['samples'] for s in summaries)
+    latency = np.array([s['latency_mean_ms'] for s in summaries])
+    latencyMax = np.array([s['latency_max_ms'] for s in summaries])
+    cpuPerSample = np.array([s['cpu_us_per_sample'] for s in summaries])
+
+    print('Watches: ', len(summaries), ' samples: ', samples, ' elapsed: ', round(elapsed, 2), ' s')
+    print('Throughput: ', round(samples/elapsed), ' samples/s, process CPU: ', round(100*cpu/elapsed, 1), ' %')
+    print('Latency mean (ms): ', round(latency.mean(), 3), ' worst: ', round(latencyMax.max(), 3))
+    print('CPU per sample (us): ', round(cpuPerSample.mean(), 2),
+          ' -> 50 Hz streams per core: ', round(1e6/(cpuPerSample.mean()*50)))
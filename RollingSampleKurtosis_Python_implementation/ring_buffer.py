@@ -0,0 +1,151 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Compact ring buffers for the samples of a stream. Instead of a Python list of boxed floats, the
+# samples are stored in a contiguous NumPy array as scaled int16 (fixed point) or float32, and converted back to
+# a Python float when they are read (e.g. the popped value used by the rolling update).
+# It also contains the single-producer/single-consumer ring that hands the samples from the sensor callback
+# thread to the thread that computes the kurtosis.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import time
+import numpy as np
+
+# Bytes used by a Python list of floats: 8 bytes per pointer + 24 bytes per float object
+PYTHON_FLOAT_BYTES = 8 + 24
+
+
+class QuantizedRingBuffer:
+    # Fixed size buffer of samples stored as dtype. For integer dtypes the samples are stored as
+    # round(value/scale), e.g. scale=0.01 keeps the two decimals logged by the watch (-9.69, 1.57) exactly and
+    # fits +-327.67 in int16. Values outside the range of the dtype are saturated.
+
+    def __init__(self, maxSize, dtype='int16', scale=0.01):
+        self.maxSize = maxSize
+        self.dtype = np.dtype(dtype)
+        self.integer = np.issubdtype(self.dtype, np.integer)
+        self.scale = scale if self.integer else 1
+        self.data = np.zeros(maxSize, dtype=self.dtype)
+        if self.integer:
+            info = np.iinfo(self.dtype)
+            self.low, self.high = info.min, info.max
+
+    def __len__(self):
+        return self.maxSize
+
+    def encode(self, value):
+        if self.integer:
+            return min(max(round(value/self.scale), self.low), self.high)
+        return value
+
+    def quantize(self, value):
+        # Value that will be read back after storing value, i.e. the value the moments have to use
+        if self.integer:
+            return self.encode(value)*self.scale
+        return float(self.dtype.type(value))
+
+    def __setitem__(self, index, value):
+        self.data[index] = self.encode(value)
+
+    def decode(self, stored):
+        if self.integer:
+            return int(stored)*self.scale
+        return float(stored)
+
+    def __getitem__(self, index):
+        return self.decode(self.data[index])
+
+    def tolist(self):
+        return (self.data*self.scale).tolist() if self.integer else self.data.tolist()
+
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class SPSCRing:
+    # Single-producer/single-consumer ring on a preallocated array. head is only written by the producer and
+    # tail only by the consumer; each side publishes its index after the data is written/read, so no lock is
+    # needed per sample (assigning an int attribute is atomic in CPython). The indexes always increase, and the
+    # position in the array is index % capacity.
+
+    def __init__(self, capacity=8192, width=1, dtype=np.float64):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, width), dtype=dtype)
+        self.head = 0           # Next index to write (producer)
+        self.tail = 0           # Next index to read (consumer)
+        self.dropped = 0        # Samples rejected because the ring was full
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def push(self, row):
+        # Producer side. Never blocks: if the consumer is behind and the ring is full the sample is dropped
+        head = self.head
+        if head - self.tail >= self.capacity:
+            self.dropped += 1
+            return False
+        self.data[head % self.capacity] = row
+        self.head = head + 1
+        return True
+
+    def push_many(self, rows):
+        # Producer side, for a decoded batch. Returns the number of rows written; the rest do not fit and are
+        # left to the caller (retry or drop)
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape(-1, self.data.shape[1])
+        head = self.head
+        n = min(len(rows), self.capacity - (head - self.tail))
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[start:start + first] = rows[:first]
+        self.data[:n - first] = rows[first:n]
+        self.head = head + n
+        return n
+
+    def drain(self, maxRows=None):
+        # Consumer side. Returns a copy of the available rows (up to maxRows), as one block
+        tail = self.tail
+        n = self.head - tail
+        if maxRows is not None:
+            n = min(n, maxRows)
+        start = tail % self.capacity
+        first = min(n, self.capacity - start)
+        block = np.concatenate((self.data[start:start + first], self.data[:n - first]))
+        self.tail = tail + n
+        return block
+
+
+def consume(ring, engine, stopEvent, block=1024, idle=0.001):
+    # Engine thread: drain the ring in blocks and feed the engine until stopEvent is set and the ring is empty
+    while True:
+        rows = ring.drain(block)
+        if len(rows):
+            engine.push_many(rows[:, 0].tolist())
+        elif stopEvent.is_set():
+            break
+        else:
+            time.sleep(idle)
@@ -0,0 +1,158 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Robust alternative to the moment-based kurtosis. Moors' octile kurtosis is computed over the
+# sliding window using an indexable skiplist, so inserting, evicting and reading the quantiles is O(log n)
+# instead of sorting the whole buffer for every new sample. Single spikes (e.g. the startup transients of the
+# watch recordings) barely change the octiles, while they dominate the fourth moment.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import random
+from math import log, floor, inf
+
+
+class _Node:
+    __slots__ = 'value', 'next', 'width'
+
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+_NIL = _Node(inf, [], [])  # Sentinel at the end of every level
+
+
+class IndexableSkiplist:
+    # Sorted container with O(log n) insert, remove and access by rank. Every link stores its width (the number
+    # of level-0 nodes it skips), which is what allows to walk to the i-th smallest value.
+
+    def __init__(self, expected_size=100, seed=None):
+        self.size = 0
+        self.maxlevels = int(1 + log(max(expected_size, 2), 2))
+        self.head = _Node('HEAD', [_NIL]*self.maxlevels, [1]*self.maxlevels)
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.size:
+            raise IndexError('skiplist index out of range')
+        node = self.head
+        i += 1
+        for level in reversed(range(self.maxlevels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def insert(self, value):
+        # Find the last node of each level whose next value is greater than the new value
+        chain = [None]*self.maxlevels
+        steps_at_level = [0]*self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        # Random height of the new node, and link it at every level below its height
+        d = min(self.maxlevels, 1 - int(log(1 - self._random.random(), 2.0)))
+        newnode = _Node(value, [None]*d, [None]*d)
+        steps = 0
+        for level in range(d):
+            prevnode = chain[level]
+            newnode.next[level] = prevnode.next[level]
+            prevnode.next[level] = newnode
+            newnode.width[level] = prevnode.width[level] - steps
+            prevnode.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(d, self.maxlevels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        # Find the last node of each level whose next value is greater or equal than the value
+        chain = [None]*self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if value != chain[0].next[0].value:
+            raise KeyError('value not found in the skiplist')
+
+        # Unlink it at every level, merging the widths
+        d = len(chain[0].next[0].next)
+        for level in range(d):
+            prevnode = chain[level]
+            prevnode.width[level] += prevnode.next[level].width[level] - 1
+            prevnode.next[level] = prevnode.next[level].next[level]
+        for level in range(d, self.maxlevels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def quantile(self, p):
+        # Same as np.quantile(data, p) with the default linear interpolation
+        pos = p*(self.size - 1)
+        lo = floor(pos)
+        frac = pos - lo
+        value = self[lo]
+        if frac > 0:
+            value += frac*(self[lo + 1] - value)
+        return value
+
+
+class RollingOctileKurtosis:
+    # Moors' octile kurtosis of the values in the window:
+    #   KR = ((E7 - E5) + (E3 - E1)) / (E6 - E2),   with Ei the i-th octile
+    # It is 1.233 for a normal distribution (the moment-based kurtosis would be 3).
+
+    def __init__(self, expected_size=5000, seed=None):
+        self.window = IndexableSkiplist(expected_size, seed)
+
+    def add(self, value):
+        self.window.insert(value)
+
+    def remove(self, value):
+        self.window.remove(value)
+
+    def octiles(self):
+        return [self.window.quantile(i/8) for i in range(1, 8)]
+
+    @property
+    def kurtosis(self):
+        if len(self.window) < 2:
+            return 0
+        q = self.window.quantile
+        E1, E2, E3, E5, E6, E7 = q(1/8), q(2/8), q(3/8), q(5/8), q(6/8), q(7/8)
+        if E6 == E2:
+            return 0
+        return ((E7 - E5) + (E3 - E1))/(E6 - E2)
@@ -0,0 +1,237 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Command line entry point for scripted batch jobs: python rsk.py process|bench|decay|figures.
+# Only the standard library is imported at startup; NumPy, SciPy and matplotlib are imported inside the
+# subcommands that use them, and nothing opens a window (figures are only written to files with the Agg
+# backend).
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DECAY_FOLDER = os.path.join(HERE, '..', '2_watch_data_processing', 'exponential_decay')
+
+# Initial guess (A, lambda, C) of the exponential fit, envelope used and envelope points removed for the slow and
+# fast watch kurtosis of every task (same choices as exponential_decay.py)
+DECAY_FITS = {
+    'shuffling_cards': {'slow': ((3.0, 0.1, 0.0), 'max', [1, 2, 3, 4]), 'fast': ((6.0, 0.5, 0.0), 'max', [0, 2])},
+    'cup_stacking': {'slow': ((1.5, 0.1, 0.0), 'min', [1, 4]), 'fast': ((1, 0.1, 0), 'min', [0, 3])},
+    'arm_wrestling': {'slow': ((2.0, 0.1, 0.0), 'max', [0, 1, 2, 3]), 'fast': ((4.0, 0.1, 0.0), 'max', [0])},
+    'handshaking': {'slow': ((20.0, 0.1, 0.0), 'max', [0, 1, 2, 3, 4, 5, 6, 7, 8]),
+                    'fast': ((50.0, 0.1, 0.0), 'max', [0, 1, 2, 3])},
+    'exploration': {'slow': ((3.0, 0.1, 0.0), 'max', [0, 1, 3]), 'fast': ((6.0, 0.1, 0.0), 'max', [0, 1])},
+    'simulated_normal': {'slow': ((3.0, 0.1, 0.0), 'max', [0, 1, 2, 3, 4, 5, 6]),
+                         'fast': ((6.0, 0.1, 0.0), 'max', [0, 1])},
+}
+
+
+def cmd_process(args):
+    from long_session import process_long_session
+    from activity_segmentation import segment_file
+
+    os.makedirs(args.out, exist_ok=True)
+    for path in args.inputs:
+        outPath = os.path.join(args.out, os.path.splitext(os.path.basename(path))[0] + '.rskc')
+        segment = None
+        if args.segment:
+            # Skip the setup movements before and after the experiment
+            segment = segment_file(path, args.chunk, fs=args.fs)[0]
+            print(path, ': experiment ', segment if segment is not None else 'not found, whole recording used')
+        result = process_long_session(path, outPath, args.window, args.fs, args.cutoff or None, args.chunk, segment)
+        print(path, ': ', result['samples'], ' samples, kurtosis ', round(result['kurtosis'], 4), ' -> ', outPath)
+
+        if args.plot:
+            import numpy as np
+            from long_session import read_output
+            from figure_export import use_agg, decimate
+            plt = use_agg()
+            output = read_output(outPath)
+            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(8, 6), sharex=True)
+            # Reduced to the figure width, a 24 h session has millions of samples
+            pixels = int(fig.get_figwidth()*fig.dpi)
+            samples = np.arange(len(output))
+            ax1.plot(*decimate(samples, output[:, 1], pixels, args.method))
+            ax1.set_ylabel('Tilt angle (º)')
+            ax2.plot(*decimate(samples, output[:, 2], pixels, args.method))
+            ax2.set_ylabel('Kurtosis')
+            ax2.set_xlabel('Samples')
+            fig.savefig(outPath[:-5] + '.png')
+            plt.close(fig)
+    return 0
+
+
+def cmd_bench(args):
+    import json
+    import timeit
+    from rsk_engine import RollingSampleKurtosis
+
+    with open(args.data) as file:
+        values = json.load(file)
+    values = (values*(args.samples//len(values) + 1))[:args.samples]
+
+    rsk = RollingSampleKurtosis(args.window)
+    start_time = timeit.default_timer()
+    rsk.push_many(values)
+    pushTime = timeit.default_timer() - start_time
+
+    rsk = RollingSampleKurtosis(args.window)
+    start_time = timeit.default_timer()
+    for value in values:
+        rsk.push(value)
+        rsk.kurtosis
+    readTime = timeit.default_timer() - start_time
+
+    print('Window ', args.window, ', ', len(values), ' samples')
+    print('push:             ', round(pushTime*1e6/len(values), 3), ' us/sample')
+    print('push + kurtosis:  ', round(readTime*1e6/len(values), 3), ' us/sample')
+    return 0
+
+
+def hl_envelopes_idx(s):
+    # Indexes of the local minima and maxima (hl_envelopes_idx() of exponential_decay.py with dmin = dmax = 1)
+    import numpy as np
+    d = np.diff(np.sign(np.diff(s)))
+    return (d > 0).nonzero()[0] + 1, (d < 0).nonzero()[0] + 1
+
+
+def decay_fit(kurt, fs, p0, envelope, removed):
+    # Exponential fit A*exp(-lambda*t) + C of the envelope of a kurtosis saturation curve
+    import numpy as np
+    from scipy.optimize import curve_fit
+
+    lmin, lmax = hl_envelopes_idx(kurt)
+    points = np.delete(lmax if envelope == 'max' else lmin, removed)
+    t = np.linspace(0, len(kurt)/fs, len(kurt))
+    popt, pcov = curve_fit(lambda x, A, lambd, C: A*np.exp(-lambd*x) + C, t[points], kurt[points], p0=p0)
+    return popt, t, points
+
+
+def cmd_decay(args):
+    import numpy as np
+    from scipy.io import loadmat
+
+    plt = None
+    if args.plot:
+        from figure_export import use_agg, decimate
+        plt = use_agg()
+        os.makedirs(args.plot, exist_ok=True)
+
+    print('{:<18} {:<5} {:>9} {:>9} {:>9} {:>12}'.format('task', 'speed', 'A', 'lambda', 'C', 't 90% (s)'))
+    for task in args.tasks:
+        for speed in args.speeds:
+            kurt = loadmat(os.path.join(args.folder, task + '_watch_decay_' + speed + '.mat'))
+            kurt = kurt['kurt_cut_watch_' + speed].flatten()
+            kurt = kurt[~np.isnan(kurt)]
+
+            p0, envelope, removed = DECAY_FITS[task][speed]
+            (A, lambd, C), t, points = decay_fit(kurt, args.fs, p0, envelope, removed)
+            print('{:<18} {:<5} {:>9.3f} {:>9.4f} {:>9.3f} {:>12.2f}'.format(
+                task, speed, A, lambd, C, -np.log(0.1)/lambd))
+            if plt is not None:
+                fig = plt.figure(figsize=(8, 4))
+                pixels = int(fig.get_figwidth()*fig.dpi)
+                plt.plot(*decimate(t, kurt, pixels, args.method), label='watch ' + speed)
+                plt.plot(t[points], kurt[points], 'm', label='envelope')
+                plt.plot(*decimate(t, A*np.exp(-lambd*t) + C, pixels, args.method), 'g', label='Exponential fit')
+                plt.title(task)
+                plt.xlabel('Time (s)')
+                plt.ylabel('Kurtosis')
+                plt.legend()
+                plt.grid()
+                fig.savefig(os.path.join(args.plot, task + '_' + speed + '_decay.png'))
+                plt.close(fig)
+    return 0
+
+
+def cmd_figures(args):
+    import timeit
+    from figure_export import export_figures
+
+    start_time = timeit.default_timer()
+    results = export_figures(args.out, args.tasks, args.speeds, args.formats, args.method, args.workers)
+    for paths, drawn, total in results:
+        print(', '.join(paths), ': ', drawn, ' of ', total, ' points drawn')
+    print(len(results), ' figures in ', round(timeit.default_timer() - start_time, 2), ' s')
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='rsk', description='Rolling Sample Kurtosis tools (headless)')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('process', help='tilt angle and rolling kurtosis of watch CSV recordings')
+    p.add_argument('inputs', nargs='+', help='watch CSV files (id;time;xs;ys;zs;ac)')
+    p.add_argument('--out', default='rsk_output', help='output folder for the .rskc files')
+    p.add_argument('--window', type=int, default=5000, help='kurtosis window (samples)')
+    p.add_argument('--fs', type=float, default=50, help='sampling frequency (Hz)')
+    p.add_argument('--cutoff', type=float, default=1, help='low-pass cutoff (Hz), 0 to disable')
+    p.add_argument('--chunk', type=int, default=16384, help='rows read at a time')
+    p.add_argument('--segment', action='store_true', help='only process the detected experiment segment')
+    p.add_argument('--plot', action='store_true', help='also save a PNG of the tilt and kurtosis')
+    p.add_argument('--method', default='minmax', choices=['minmax', 'lttb', 'none'],
+                   help='downsampling of the plotted series to the figure width')
+    p.set_defaults(func=cmd_process)
+
+    p = sub.add_parser('bench', help='time the RSK engine')
+    p.add_argument('--data', default=os.path.join(HERE, 'data_10000.json'), help='JSON list of values')
+    p.add_argument('--samples', type=int, default=100000, help='number of samples pushed')
+    p.add_argument('--window', type=int, default=5000, help='kurtosis window (samples)')
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser('decay', help='exponential fit of the watch kurtosis saturation curves')
+    p.add_argument('tasks', nargs='*', default=list(DECAY_FITS), help='tasks (default: all)')
+    p.add_argument('--speeds', nargs='+', default=['slow', 'fast'], choices=['slow', 'fast'])
+    p.add_argument('--folder', default=DECAY_FOLDER, help='folder with the *_watch_decay_*.mat files')
+    p.add_argument('--fs', type=float, default=50, help='sampling frequency (Hz)')
+    p.add_argument('--plot', default=None, help='folder where the figures are saved (PNG)')
+    p.add_argument('--method', default='minmax', choices=['minmax', 'lttb', 'none'],
+                   help='downsampling of the plotted series to the figure width')
+    p.set_defaults(func=cmd_decay)
+
+    p = sub.add_parser('figures', help='render the tilt and kurtosis figures of every task and speed to files')
+    p.add_argument('tasks', nargs='*', default=list(DECAY_FITS), help='tasks (default: all)')
+    p.add_argument('--speeds', nargs='+', default=['slow', 'fast'], choices=['slow', 'fast'])
+    p.add_argument('--out', default='figures', help='output folder')
+    p.add_argument('--formats', nargs='+', default=['png'], choices=['png', 'svg', 'pdf'])
+    p.add_argument('--method', default='minmax', choices=['minmax', 'lttb', 'none'],
+                   help='downsampling to the figure width')
+    p.add_argument('--workers', type=int, default=None, help='worker processes (default: all the cores)')
+    p.set_defaults(func=cmd_figures)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,772 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Reusable Rolling Sample Kurtosis (RSK) engine. It keeps the circular buffer and the rolling
+# moments of one sensor stream, using the same incremental and rolling equations as rolling_kurtosis() in
+# main.py, so that it can be fed sample by sample from any source.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import numpy as np
+import struct
+from math import comb
+from collections import deque
+from robust_kurtosis import RollingOctileKurtosis
+from ring_buffer import QuantizedRingBuffer, PYTHON_FLOAT_BYTES
+
+# Binary snapshot of the engine state: magic, version, quantized flag, buffer dtype, maxSize, iter, currentIndex,
+# buffer scale, mean, M2, M3, M4, kurtosis. It is followed by the stored samples of the buffer
+SNAPSHOT_MAGIC = b'RSKS'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sBBcxIIIdddddd')
+SNAPSHOT_FILE_HEADER = struct.Struct('<4sBxxxI')   # magic, version, number of snapshots
+
+
+def add_sample(n, mean, M2, M3, M4, x):
+    # Add x to a set of n samples (same cumulative equations as the incremental branch of rolling_kurtosis())
+    n1 = n + 1
+    delta = x - mean
+    delta_n = delta/n1
+    delta_n2 = delta_n*delta_n
+    term1 = delta*delta_n*n
+    M4 = M4 + term1*delta_n2*(n1*n1 - 3*n1 + 3) + 6*delta_n2*M2 - 4*delta_n*M3
+    M3 = M3 + term1*delta_n*(n1 - 2) - 3*delta_n*M2
+    M2 = M2 + term1
+    return n1, mean + delta_n, M2, M3, M4
+
+
+def remove_sample(n, mean, M2, M3, M4, x):
+    # Inverse of add_sample(): remove x from a set of n samples that contains it
+    if n <= 1:
+        return 0, 0, 0, 0, 0
+    n0 = n - 1
+    oldMean = (n*mean - x)/n0
+    delta = x - oldMean
+    delta_n = delta/n
+    delta_n2 = delta_n*delta_n
+    term1 = delta*delta_n*n0
+    M2 = M2 - term1
+    M3 = M3 - term1*delta_n*(n - 2) + 3*delta_n*M2
+    M4 = M4 - term1*delta_n2*(n*n - 3*n + 3) - 6*delta_n2*M2 + 4*delta_n*M3
+    return n0, oldMean, M2, M3, M4
+
+
+def merge_moments(na, meanA, M2a, M3a, M4a, nb, meanB, M2b, M3b, M4b):
+    # Moments of the union of two sets of samples from the moments of each set (works element-wise on arrays).
+    # Empty sets (n = 0) are allowed
+    n = na + nb
+    nSafe = np.maximum(n, 1) if isinstance(n, np.ndarray) else max(n, 1)
+    delta = meanB - meanA
+    delta_n = delta/nSafe
+    delta_n2 = delta_n*delta_n
+    nab = na*nb
+
+    mean = meanA + delta_n*nb
+    M2 = M2a + M2b + delta*delta_n*nab
+    M3 = M3a + M3b + delta*delta_n2*nab*(na - nb) + 3*delta_n*(na*M2b - nb*M2a)
+    M4 = M4a + M4b + delta*delta_n*delta_n2*nab*(na*na - nab + nb*nb) + \
+        6*delta_n2*(na*na*M2b + nb*nb*M2a) + 4*delta_n*(na*M3b - nb*M3a)
+    return n, mean, M2, M3, M4
+
+
+class SlidingHistogram:
+    # Fixed-bin histogram of the values inside the sliding window. Every push/eviction changes one bin by +-1,
+    # and the moving average of the bins (movmean(H.Values, smoothWindow) in the MATLAB scripts) is updated
+    # with it, so the smoothed view never needs to rescan the buffer.
+
+    def __init__(self, bins=36, valueRange=(0, 180), smoothWindow=5):
+        self.bins = bins
+        self.low, self.high = valueRange
+        self.binWidth = (self.high - self.low)/bins
+        self.edges = np.linspace(self.low, self.high, bins + 1)
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.smoothed = np.zeros(bins)
+
+        # For every bin, the smoothed bins that contain it and the weight (1/elements in their window).
+        # The window is shrunk at the edges, like movmean does
+        before = smoothWindow//2
+        after = smoothWindow - 1 - before
+        self._neighbours = []
+        for b in range(bins):
+            j = np.arange(max(0, b - after), min(bins, b + before + 1))
+            size = np.minimum(j + after, bins - 1) - np.maximum(j - before, 0) + 1
+            self._neighbours.append((j, 1/size))
+
+    def bin_index(self, value):
+        # Values outside the range are accumulated in the first/last bin
+        b = int((value - self.low)//self.binWidth)
+        return min(max(b, 0), self.bins - 1)
+
+    def add(self, value):
+        b = self.bin_index(value)
+        self.counts[b] += 1
+        j, w = self._neighbours[b]
+        self.smoothed[j] += w
+
+    def remove(self, value):
+        b = self.bin_index(value)
+        self.counts[b] -= 1
+        j, w = self._neighbours[b]
+        self.smoothed[j] -= w
+
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:])/2
+
+
+class RollingSampleKurtosis:
+
+    def __init__(self, maxSize, histogramBins=None, histogramRange=(0, 180), histogramSmooth=5, momentOrder=None,
+                 robust=False, bufferDtype=None, bufferScale=0.01):
+        self.maxSize = maxSize
+
+        # By default the samples are kept in a list, as in main.py. With bufferDtype ('int16', 'float32') they are
+        # stored in a compact array, and the moments use the stored (quantized) values so that the popped value
+        # is exactly the one that was added
+        self.quantized = bufferDtype is not None
+        if self.quantized:
+            self.circularBuffer = QuantizedRingBuffer(maxSize, bufferDtype, bufferScale)
+        else:
+            self.circularBuffer = [None] * maxSize
+        self.currentIndex = 0
+        self.iter = 0
+        self.mean, self.M2, self.M3, self.M4 = 0, 0, 0, 0
+
+        # Optional distribution of the values in the window, maintained alongside the moments
+        self.histogram = None
+        if histogramBins:
+            self.histogram = SlidingHistogram(histogramBins, histogramRange, histogramSmooth)
+
+        # Optional power sums S_k = sum((x - shift)^k), k = 0..momentOrder, for central moments of any order.
+        # The values are shifted by the first sample to keep the sums small
+        self.momentOrder = momentOrder
+        self.powerSums = None
+        self.shift = 0
+        if momentOrder:
+            self.powerSums = [0.0] * (momentOrder + 1)
+
+        # Optional sorted copy of the window for the robust (octile based) kurtosis
+        self.robust = None
+        if robust:
+            self.robust = RollingOctileKurtosis(maxSize)
+
+    def push(self, newValue):
+        # Equivalent to simulate_onSensorChanged() + rolling_kurtosis() in main.py.
+        # poppedValue is None while the buffer is still filling
+        if self.quantized:
+            newValue = self.circularBuffer.quantize(newValue)
+
+        poppedValue = None
+        if self.iter < self.maxSize:
+            self.iter += 1
+        else:
+            poppedValue = self.circularBuffer[self.currentIndex]
+
+        self.circularBuffer[self.currentIndex] = newValue
+        self.currentIndex = (self.currentIndex + 1) % self.maxSize
+
+        if self.histogram is not None:
+            self.histogram.add(newValue)
+            if poppedValue is not None:
+                self.histogram.remove(poppedValue)
+
+        if self.powerSums is not None:
+            self.update_power_sums(newValue, poppedValue)
+
+        if self.robust is not None:
+            self.robust.add(newValue)
+            if poppedValue is not None:
+                self.robust.remove(poppedValue)
+
+        # Only the moments are updated per sample, the kurtosis is computed when it is read
+        self.update_moments(newValue, poppedValue)
+
+    def push_many(self, values):
+        for value in values:
+            self.push(value)
+        return self.kurtosis
+
+    def update_moments(self, newValue, poppedValue):
+        _iter = self.iter
+        _mean, _M2, _M3, _M4 = self.mean, self.M2, self.M3, self.M4
+
+        # Add first value
+        if _iter == 1 and poppedValue is None:
+            newMean = newValue
+            newM2 = 0
+            newM3 = 0
+            newM4 = 0
+
+        # Buffer is not full, apply incremental approach
+        elif poppedValue is None:
+            delta = newValue - _mean
+            delta_n = delta/_iter
+            delta_n2 = delta_n*delta_n
+            term1 = delta * delta_n * (_iter-1)
+
+            # Cumulative Sample Mean (CSM)
+            newMean = _mean + delta_n
+
+            # Mid variables
+            dif1 = newValue - newMean
+            dif2 = newMean - _mean
+
+            # Cumulative Sample Variance (CSV)
+            newM2 = _M2 + dif1*(newValue - _mean)
+
+            # Cumulative Sample Skewness (CSS)
+            newM3 = _M3 - 3*dif2*_M2 + (newM2 - _M2)*(dif1 - dif2)
+
+            # Cumulative Sample Kurtosis (CSK)
+            newM4 = _M4 + term1 * delta_n2 * (_iter*_iter - 3*_iter + 3) + 6*delta_n2*_M2 - 4*delta_n*_M3
+
+        # Buffer is full. Apply Rolling Approach
+        else:
+            dif3 = newValue - poppedValue
+
+            # Rolling Sample Mean (RSM)
+            newMean = _mean + dif3/self.maxSize
+
+            dif4 = poppedValue - newMean
+            dif5 = newValue - newMean
+            dif6 = newMean - _mean
+            dif7 = poppedValue - _mean
+            sum1 = dif4 + dif5
+
+            # Rolling Sample Variance (RSV)
+            newM2 = _M2 + dif3*(dif5+dif7)
+
+            # Rolling Sample Skewness (RSS)
+            newM3 = _M3 - 3*dif6*_M2 + dif3*(dif7*(dif4-dif6) + dif5*sum1)
+
+            # Rolling Sample Kurtosis (RSK)
+            dif6_2 = dif6*dif6
+            newM4 = _M4 - 4*dif6*_M3 + 6*dif6_2*_M2 + dif3*(dif6*dif6_2 + sum1*(dif5*dif5 + dif4*dif4))
+
+        self.mean = newMean
+        self.M2 = newM2
+        self.M3 = newM3
+        self.M4 = newM4
+
+    @property
+    def kurtosis(self):
+        # Kurtosis of the window (to avoid division by 0 when all the values are equal)
+        if self.M2 == 0:
+            return 0
+        return self.iter * self.M4 / (self.M2 * self.M2)
+
+    def update_power_sums(self, newValue, poppedValue):
+        if self.iter == 1 and poppedValue is None:
+            self.shift = newValue
+        x_new = newValue - self.shift
+        x_pop = 0 if poppedValue is None else poppedValue - self.shift
+        p_new, p_pop = 1.0, 1.0
+        for k in range(self.momentOrder + 1):
+            self.powerSums[k] += p_new
+            if poppedValue is not None:
+                self.powerSums[k] -= p_pop
+            p_new *= x_new
+            p_pop *= x_pop
+
+    def variance(self):
+        # Rolling (population) variance of the window
+        return self.M2/self.iter if self.iter else 0
+
+    def skewness(self):
+        # Rolling Sample Skewness, from the M3 that rolling_kurtosis() already maintains
+        if self.M2 == 0:
+            return 0
+        return self.iter**0.5 * self.M3 / self.M2**1.5
+
+    def statistics(self):
+        # All the shape statistics from the same O(1) update
+        return self.mean, self.variance(), self.skewness(), self.kurtosis
+
+    def central_moment(self, p):
+        # Order-p central moment of the window from the power sums, using the binomial expansion
+        # m_p = 1/n * sum_k C(p, k) * S_k * (-d)^(p-k), where d is the mean of the shifted values
+        if self.powerSums is None or p > self.momentOrder:
+            raise ValueError('central_moment({}) requires momentOrder >= {}'.format(p, p))
+        n = self.powerSums[0]
+        if n == 0:
+            return 0
+        d = self.powerSums[1]/n
+        return sum(comb(p, k) * self.powerSums[k] * (-d)**(p - k) for k in range(p + 1))/n
+
+    def standardized_moment(self, p):
+        m2 = self.central_moment(2)
+        if m2 == 0:
+            return 0
+        return self.central_moment(p) / m2**(p/2)
+
+    def octile_kurtosis(self):
+        # Moors' octile kurtosis of the window (requires robust=True)
+        if self.robust is None:
+            raise ValueError('octile_kurtosis() requires robust=True')
+        return self.robust.kurtosis
+
+    def resize(self, newSize):
+        # Change the window length in place. Shrinking evicts the oldest samples with the inverse of the
+        # incremental equations; growing leaves the buffer not full, so the next samples use the incremental
+        # branch until it is full again. No moment is recomputed from the buffer
+        if newSize < 1:
+            raise ValueError('the window size must be at least 1')
+
+        count = min(self.iter, self.maxSize)
+        if self.quantized:
+            data = self.circularBuffer.data
+            ordered = np.concatenate((data[self.currentIndex:count], data[:self.currentIndex])) \
+                if count == self.maxSize else data[:count]
+        else:
+            ordered = self.window()
+
+        evicted = max(count - newSize, 0)
+        n, mean, M2, M3, M4 = count, self.mean, self.M2, self.M3, self.M4
+        for i in range(evicted):
+            poppedValue = self.circularBuffer.decode(ordered[i]) if self.quantized else ordered[i]
+            n, mean, M2, M3, M4 = remove_sample(n, mean, M2, M3, M4, poppedValue)
+            if self.histogram is not None:
+                self.histogram.remove(poppedValue)
+            if self.robust is not None:
+                self.robust.remove(poppedValue)
+            if self.powerSums is not None:
+                x_pop = poppedValue - self.shift
+                for k in range(self.momentOrder + 1):
+                    self.powerSums[k] -= x_pop**k
+        if n == 1:
+            # A single sample has no spread: clear the rounding left by the removals
+            mean = self.circularBuffer.decode(ordered[-1]) if self.quantized else ordered[-1]
+            M2, M3, M4 = 0, 0, 0
+
+        # New buffer with the remaining samples, from the oldest to the newest
+        kept = ordered[evicted:]
+        if self.quantized:
+            self.circularBuffer = QuantizedRingBuffer(newSize, self.circularBuffer.dtype, self.circularBuffer.scale)
+            self.circularBuffer.data[:len(kept)] = kept
+        else:
+            self.circularBuffer = list(kept) + [None] * (newSize - len(kept))
+
+        self.maxSize = newSize
+        self.iter = n
+        self.currentIndex = n % newSize
+        self.mean, self.M2, self.M3, self.M4 = mean, M2, M3, M4
+        return self.kurtosis
+
+    def snapshot(self):
+        # Compact binary copy of the state. Only the filled part of the buffer is written, in its stored format
+        count = min(self.iter, self.maxSize)
+        if self.quantized:
+            data = self.circularBuffer.data[:count]
+            scale = self.circularBuffer.scale
+        else:
+            data = np.array(self.circularBuffer[:count], dtype=np.float64)
+            scale = 1
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, int(self.quantized),
+                                      data.dtype.char.encode(), self.maxSize, self.iter, self.currentIndex, scale,
+                                      self.mean, self.M2, self.M3, self.M4, self.kurtosis)
+        return header + data.astype(data.dtype.newbyteorder('<')).tobytes()
+
+    @classmethod
+    def restore(cls, snapshot, **options):
+        # Engine with the same state as the one that produced the snapshot. The optional structures (histogram,
+        # power sums, robust kurtosis) are passed in options and rebuilt from the samples of the window
+        (magic, version, quantized, dtypeChar, maxSize, _iter, currentIndex, scale,
+         mean, M2, M3, M4, _) = SNAPSHOT_HEADER.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('not an RSK snapshot')
+        if version != SNAPSHOT_VERSION:
+            raise ValueError('unsupported RSK snapshot version {}'.format(version))
+
+        dtype = np.dtype(dtypeChar.decode()).newbyteorder('<')
+        count = min(_iter, maxSize)
+        data = np.frombuffer(snapshot, dtype=dtype, count=count, offset=SNAPSHOT_HEADER.size)
+
+        if quantized:
+            options.update(bufferDtype=dtype.newbyteorder('='), bufferScale=scale)
+        engine = cls(maxSize, **options)
+        if quantized:
+            engine.circularBuffer.data[:count] = data
+        else:
+            engine.circularBuffer[:count] = data.tolist()
+        engine.iter = _iter
+        engine.currentIndex = currentIndex
+        engine.mean, engine.M2, engine.M3, engine.M4 = mean, M2, M3, M4
+
+        window = engine.window()
+        if engine.histogram is not None:
+            for value in window:
+                engine.histogram.add(value)
+        if engine.robust is not None:
+            for value in window:
+                engine.robust.add(value)
+        if engine.powerSums is not None and window:
+            engine.shift = window[0]
+            for k in range(engine.momentOrder + 1):
+                engine.powerSums[k] = sum((value - engine.shift)**k for value in window)
+        return engine
+
+    def window(self):
+        # Values in the buffer, from the oldest to the newest
+        values = self.circularBuffer.tolist() if self.quantized else self.circularBuffer
+        if self.iter < self.maxSize:
+            return values[:self.iter]
+        return values[self.currentIndex:] + values[:self.currentIndex]
+
+
+class DecimatedEmitter:
+    # Publishes the kurtosis of an engine every k-th sample, or every period seconds when timestamps are given,
+    # into preallocated arrays. The engine only updates its moments for the other samples.
+
+    def __init__(self, engine, every=50, period=None, capacity=4096, timeScale=1e-9):
+        self.engine = engine
+        self.every = every
+        self.period = period
+        self.timeScale = timeScale
+        self.count = 0
+        self.nextTime = None
+
+        self.size = 0
+        self.values = np.empty(capacity)
+        self.samples = np.empty(capacity, dtype=np.int64)
+        self.times = np.empty(capacity)
+
+    def push(self, newValue, timestamp=None):
+        self.engine.push(newValue)
+        self.count += 1
+        if self.period is not None and timestamp is not None:
+            t = timestamp*self.timeScale
+            if self.nextTime is None:
+                self.nextTime = t + self.period
+            elif t >= self.nextTime:
+                self.nextTime += self.period*((t - self.nextTime)//self.period + 1)
+                self.emit(t)
+        elif self.count % self.every == 0:
+            self.emit(np.nan)
+
+    def push_many(self, values, timestamps=None):
+        if timestamps is None:
+            for value in values:
+                self.push(value)
+        else:
+            for value, timestamp in zip(values, timestamps):
+                self.push(value, timestamp)
+
+    def emit(self, t):
+        if self.size == len(self.values):
+            # Out of preallocated space: double the arrays (amortized O(1))
+            self.values = np.concatenate((self.values, np.empty_like(self.values)))
+            self.samples = np.concatenate((self.samples, np.empty_like(self.samples)))
+            self.times = np.concatenate((self.times, np.empty_like(self.times)))
+        self.values[self.size] = self.engine.kurtosis
+        self.samples[self.size] = self.count
+        self.times[self.size] = t
+        self.size += 1
+
+    def output(self):
+        # Views of the emitted kurtosis values, the sample count and the time at which they were emitted
+        return self.values[:self.size], self.samples[:self.size], self.times[:self.size]
+
+    def clear(self):
+        self.size = 0
+
+
+class RollingMardiaKurtosis:
+    # Rolling multivariate (Mardia) kurtosis of the windowed d-axis vectors (e.g. xs, ys, zs of the watch)
+    #   b2 = 1/n * sum_i ((x_i - mean)^T S^-1 (x_i - mean))^2,   with S the (biased) covariance of the window
+    # The mean and the co-moment matrix are updated with rank-one updates on push/evict. The fourth order term
+    # is expanded around the mean, so it only needs the power sums R1..R4 of the shifted vectors, which are also
+    # updated on push/evict. Nothing is recomputed from the window: the cost per sample does not depend on n.
+
+    def __init__(self, maxSize, dim=3):
+        self.maxSize = maxSize
+        self.dim = dim
+        self.circularBuffer = np.zeros((maxSize, dim))
+        self.currentIndex = 0
+        self.iter = 0
+
+        self.mean = np.zeros(dim)
+        self.C = np.zeros((dim, dim))          # Co-moment matrix, sum((x - mean)(x - mean)^T)
+
+        self.shift = np.zeros(dim)
+        self.R1 = np.zeros(dim)
+        self.R2 = np.zeros((dim, dim))
+        self.R3 = np.zeros((dim, dim, dim))
+        self.R4 = np.zeros((dim, dim, dim, dim))
+
+    def push(self, newValue):
+        newValue = np.asarray(newValue, dtype=float)
+        poppedValue = None
+        if self.iter < self.maxSize:
+            self.iter += 1
+        else:
+            poppedValue = self.circularBuffer[self.currentIndex].copy()
+
+        self.circularBuffer[self.currentIndex] = newValue
+        self.currentIndex = (self.currentIndex + 1) % self.maxSize
+
+        if self.iter == 1 and poppedValue is None:
+            self.shift = newValue.copy()
+
+        if poppedValue is None:
+            # Incremental approach (rank-one update of the co-moment matrix)
+            delta = newValue - self.mean
+            self.mean = self.mean + delta/self.iter
+            self.C += np.outer(delta, newValue - self.mean)
+            self.add_power_sums(newValue, 1)
+        else:
+            # Rolling approach: evict the popped vector, then add the new one
+            delta = poppedValue - self.mean
+            self.mean = self.mean - delta/(self.maxSize - 1)
+            self.C -= np.outer(delta, poppedValue - self.mean)
+            self.add_power_sums(poppedValue, -1)
+
+            delta = newValue - self.mean
+            self.mean = self.mean + delta/self.maxSize
+            self.C += np.outer(delta, newValue - self.mean)
+            self.add_power_sums(newValue, 1)
+
+    def add_power_sums(self, value, sign):
+        z = value - self.shift
+        zz = np.multiply.outer(z, z)
+        zzz = np.multiply.outer(zz, z)
+        self.R1 += sign*z
+        self.R2 += sign*zz
+        self.R3 += sign*zzz
+        self.R4 += sign*np.multiply.outer(zzz, z)
+
+    def covariance(self):
+        return self.C/self.iter if self.iter else self.C
+
+    @property
+    def kurtosis(self):
+        # Computed when it is read (the inverse and the contractions are not needed for every sample)
+        n = self.iter
+        if n <= self.dim:
+            return 0
+        try:
+            A = np.linalg.inv(self.C/n)
+        except np.linalg.LinAlgError:
+            return 0
+
+        # (y^T A y) with y = z - mu is q(z) - 2 Amu.z + c, where q(z) = z^T A z, Amu = A mu and c = mu^T A mu
+        mu = self.mean - self.shift
+        Amu = A @ mu
+        c = mu @ Amu
+        sum_q2 = np.einsum('ab,cd,abcd->', A, A, self.R4)
+        sum_qAmu = np.einsum('ab,c,abc->', A, Amu, self.R3)
+        sum_q = np.einsum('ab,ab->', A, self.R2)
+        sum_Amu2 = Amu @ self.R2 @ Amu
+        sum_Amu = Amu @ self.R1
+        return (sum_q2 - 4*sum_qAmu + 2*c*sum_q + 4*sum_Amu2 - 4*c*sum_Amu + n*c*c)/n
+
+
+class TimeWindowKurtosis:
+    # Kurtosis over the last windowSeconds of data, using the timestamps of the samples instead of a fixed number
+    # of samples. Every sample is added once and evicted once, so the cost is amortized O(1) per sample even if
+    # the sampling jitters or some batches are dropped.
+    # A gap is detected when two consecutive samples are more than gapThreshold periods apart. With
+    # interpolateGaps=True the missing samples (at the nominal period, up to maxFill of them) are filled by
+    # linear interpolation between the last sample and the new one.
+
+    def __init__(self, windowSeconds, fs=50, timeScale=1e-9, gapThreshold=2.5, interpolateGaps=False,
+                 maxFill=250):
+        self.windowSeconds = windowSeconds
+        self.period = 1/fs
+        self.timeScale = timeScale            # The watch CSV timestamps are in nanoseconds
+        self.gapThreshold = gapThreshold
+        self.interpolateGaps = interpolateGaps
+        self.maxFill = maxFill
+
+        self.samples = deque()                # (time in seconds, value)
+        self.n, self.mean, self.M2, self.M3, self.M4 = 0, 0, 0, 0, 0
+        self.gaps = []                        # (start, end) times of the detected gaps, in seconds
+
+    def push(self, timestamp, newValue):
+        t = timestamp*self.timeScale
+
+        if self.samples:
+            lastTime, lastValue = self.samples[-1]
+            dt = t - lastTime
+            if dt > self.gapThreshold*self.period:
+                self.gaps.append((lastTime, t))
+                if self.interpolateGaps:
+                    missing = min(int(round(dt/self.period)) - 1, self.maxFill)
+                    for k in range(1, missing + 1):
+                        frac = k/(missing + 1)
+                        self.add(lastTime + frac*dt, lastValue + frac*(newValue - lastValue))
+
+        self.add(t, newValue)
+
+        # Evict the samples that are older than the window
+        while self.samples[0][0] <= t - self.windowSeconds:
+            _, poppedValue = self.samples.popleft()
+            self.n, self.mean, self.M2, self.M3, self.M4 = remove_sample(self.n, self.mean, self.M2, self.M3,
+                                                                         self.M4, poppedValue)
+        if self.n == 1:
+            # After a gap longer than the window only the new sample is left: reset the moments exactly, so the
+            # rounding left by the removals is not carried forward
+            self.mean, self.M2, self.M3, self.M4 = self.samples[0][1], 0, 0, 0
+
+    @property
+    def kurtosis(self):
+        if self.M2 == 0:
+            return 0
+        return self.n * self.M4 / (self.M2 * self.M2)
+
+    def add(self, t, value):
+        self.samples.append((t, value))
+        self.n, self.mean, self.M2, self.M3, self.M4 = add_sample(self.n, self.mean, self.M2, self.M3, self.M4,
+                                                                  value)
+
+
+def write_snapshots(file, engines):
+    # Write the snapshots of many engines at once: a file header followed by length-prefixed snapshots
+    snapshots = [engine.snapshot() for engine in engines]
+    parts = [SNAPSHOT_FILE_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(snapshots))]
+    for snapshot in snapshots:
+        parts.append(struct.pack('<I', len(snapshot)))
+        parts.append(snapshot)
+    file.write(b''.join(parts))
+
+
+def read_snapshots(file, **options):
+    data = file.read()
+    magic, version, count = SNAPSHOT_FILE_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError('not an RSK snapshot file, or unsupported version')
+    engines = []
+    offset = SNAPSHOT_FILE_HEADER.size
+    view = memoryview(data)
+    for _ in range(count):
+        (length,) = struct.unpack_from('<I', data, offset)
+        offset += 4
+        engines.append(RollingSampleKurtosis.restore(view[offset:offset + length], **options))
+        offset += length
+    return engines
+
+
+def alpha_from_half_life(halfLife):
+    # Weight of the newest sample so that the weight of a sample halves every halfLife samples
+    return 1 - 2**(-1/halfLife)
+
+
+def alpha_from_window(windowSize):
+    # Weight of the newest sample whose exponential window has the same mean sample age ((N-1)/2) as a
+    # rectangular window of windowSize samples, i.e. alpha = 2/(N+1). The half-life is then about 0.35*N
+    return 2/(windowSize + 1)
+
+
+class ExponentialKurtosis:
+    # Exponentially weighted moving kurtosis. It does not need the circular buffer (there is no popped value):
+    # the state is only the EW mean and the EW central moments M2, M3, M4, so the memory per stream is a few
+    # floats instead of maxSize samples.
+    # At every sample the old moments are shifted to the new mean and mixed with the new value:
+    #   M_k = (1 - alpha) * E_old[(x - newMean)^k] + alpha * (newValue - newMean)^k
+    __slots__ = 'alpha', 'iter', 'mean', 'M2', 'M3', 'M4'
+
+    def __init__(self, halfLife=None, windowSize=None, alpha=None):
+        if alpha is None:
+            if halfLife is not None:
+                alpha = alpha_from_half_life(halfLife)
+            elif windowSize is not None:
+                alpha = alpha_from_window(windowSize)
+            else:
+                raise ValueError('one of halfLife, windowSize or alpha is required')
+        self.alpha = alpha
+        self.iter = 0
+        self.mean, self.M2, self.M3, self.M4 = 0.0, 0.0, 0.0, 0.0
+
+    def push(self, newValue):
+        self.iter += 1
+        if self.iter == 1:
+            self.mean = newValue
+            return
+
+        a = self.alpha
+        b = 1 - a
+        d = a*(newValue - self.mean)          # newMean - mean
+        newMean = self.mean + d
+        e = newValue - newMean
+        d2 = d*d
+        e2 = e*e
+        M2, M3, M4 = self.M2, self.M3, self.M4
+
+        self.M4 = b*(M4 - 4*d*M3 + 6*d2*M2 + d2*d2) + a*e2*e2
+        self.M3 = b*(M3 - 3*d*M2 - d2*d) + a*e2*e
+        self.M2 = b*(M2 + d2) + a*e2
+        self.mean = newMean
+
+    def push_many(self, values):
+        for value in values:
+            self.push(value)
+        return self.kurtosis
+
+    def variance(self):
+        return self.M2
+
+    def skewness(self):
+        return self.M3/self.M2**1.5 if self.M2 != 0 else 0
+
+    @property
+    def kurtosis(self):
+        return self.M4/(self.M2*self.M2) if self.M2 != 0 else 0
+
+
+if __name__ == '__main__':
+    import json
+    from scipy.stats import kurtosis
+
+    MAX_SIZE = 5000
+
+    with open("data_10000.json", "r") as file:
+        SIM_SENSOR_VALUES = json.load(file)
+
+    rsk = RollingSampleKurtosis(MAX_SIZE, histogramBins=36, histogramRange=(0, 1), momentOrder=6)
+    rsk.push_many(SIM_SENSOR_VALUES)
+
+    print('Using RSK: ', rsk.kurtosis)
+    print('Using scipy.stats: ', kurtosis(rsk.window(), fisher=False))
+    print('Mean, variance, skewness, kurtosis: ', rsk.statistics())
+    print('6th standardized moment: ', rsk.standardized_moment(6))
+    print('Histogram counts: ', rsk.histogram.counts)
+    print('Smoothed histogram: ', rsk.histogram.smoothed)
+
+    # Same window with the samples stored as int16 (the watch logs two decimals)
+    rsk16 = RollingSampleKurtosis(MAX_SIZE, bufferDtype='int16')
+    rsk16.push_many(SIM_SENSOR_VALUES)
+    print('int16 buffer: ', rsk16.kurtosis, ' in ', rsk16.circularBuffer.nbytes(), ' bytes vs ',
+          MAX_SIZE*PYTHON_FLOAT_BYTES, ' bytes for a list of floats')
+
+    # 10 s time window at 50 Hz, then a 60 s gap (longer than the window) in the timestamps
+    timeWindow = TimeWindowKurtosis(10)
+    for i, value in enumerate(SIM_SENSOR_VALUES[:1000]):
+        timeWindow.push(i*2e7, value)
+    print('Time window: ', timeWindow.kurtosis, ' using scipy.stats: ',
+          kurtosis([value for _, value in timeWindow.samples], fisher=False))
+    timeWindow.push(1000*2e7 + 60e9, 1.0)
+    print('After a gap longer than the window (1 sample left): ', timeWindow.n, timeWindow.M2, timeWindow.kurtosis)
+    timeWindow.push(1001*2e7 + 60e9, 1.0)
+    print('Next sample: ', timeWindow.mean, timeWindow.M2, timeWindow.kurtosis)
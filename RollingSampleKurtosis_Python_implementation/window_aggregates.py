@@ -0,0 +1,138 @@
+# -----------------------------------------------------------------------------
+# Title: Real-time sensing of upper extremity movement diversity using kurtosis implemented on a smartwatch
+# Author: Guillem Cornella i Barba
+# Affiliation: Department of Mechanical and Aerospace Engineering, University of California Irvine
+# Email: cornellg@uci.edu
+# Date: 20th June 2024
+#
+# Description: Windowed aggregates. Instead of running the per-sample rolling kurtosis and subsampling its output, the
+# moments of non-overlapping (tumbling) windows are computed for the whole recording at once with a strided reshape, and
+# the moments of hopping windows (length = k hops) are obtained by merging the per-hop summaries. Since the
+# watch recordings are resampled to a multiple of 15 repetitions, the kurtosis of every trajectory repetition
+# is a tumbling window of len/15 samples.
+# ------------------------------------------------------------------------------
+#
+# Copyright (c) [2024] [Guillem Cornella i Barba]
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from rsk_engine import merge_moments
+
+
+def tumbling_moments(values, windowSize, partial=False):
+    # (n, mean, M2, M3, M4) arrays with one element per non-overlapping window. The last incomplete window is
+    # dropped, unless partial is True
+    values = np.asarray(values, dtype=np.float64)
+    nWindows = len(values)//windowSize
+    X = values[:nWindows*windowSize].reshape(nWindows, windowSize)
+
+    n = np.full(nWindows, windowSize)
+    mean = X.mean(axis=1)
+    D = X - mean[:, None]
+    D2 = D*D
+    M2 = D2.sum(axis=1)
+    M3 = (D2*D).sum(axis=1)
+    M4 = (D2*D2).sum(axis=1)
+
+    rest = values[nWindows*windowSize:]
+    if partial and len(rest):
+        d = rest - rest.mean()
+        n = np.append(n, len(rest))
+        mean = np.append(mean, rest.mean())
+        M2 = np.append(M2, np.sum(d**2))
+        M3 = np.append(M3, np.sum(d**3))
+        M4 = np.append(M4, np.sum(d**4))
+    return n, mean, M2, M3, M4
+
+
+def hopping_moments(values, windowSize, hop):
+    # Moments of the windows [i*hop, i*hop + windowSize), merging windowSize/hop consecutive per-hop summaries
+    if windowSize % hop != 0:
+        raise ValueError('windowSize must be a multiple of hop')
+    k = windowSize//hop
+    hops = tumbling_moments(values, hop)
+    nWindows = len(hops[0]) - k + 1
+    if nWindows <= 0:
+        return tuple(np.empty(0) for _ in range(5))
+
+    result = tuple(m[:nWindows] for m in hops)
+    for j in range(1, k):
+        result = merge_moments(*result, *(m[j:j + nWindows] for m in hops))
+    return result
+
+
+def moments_kurtosis(n, M2, M4):
+    # Element-wise n*M4/M2^2, 0 for constant windows (as in the RSK engine)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(M2 > 0, n*M4/(M2*M2), 0)
+
+
+def moments_skewness(n, M2, M3):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(M2 > 0, np.sqrt(n)*M3/M2**1.5, 0)
+
+
+def tumbling_kurtosis(values, windowSize, partial=False):
+    n, mean, M2, M3, M4 = tumbling_moments(values, windowSize, partial)
+    return moments_kurtosis(n, M2, M4)
+
+
+def hopping_kurtosis(values, windowSize, hop):
+    n, mean, M2, M3, M4 = hopping_moments(values, windowSize, hop)
+    return moments_kurtosis(n, M2, M4)
+
+
+def repetition_kurtosis(values, repetitions=15):
+    # Kurtosis of every trajectory repetition of a recording resampled to a multiple of the repetitions
+    if len(values) % repetitions != 0:
+        raise ValueError('the recording length must be a multiple of the number of repetitions')
+    return tumbling_kurtosis(values, len(values)//repetitions)
+
+
+if __name__ == '__main__':
+    import timeit
+    from scipy.io import loadmat
+    from scipy.stats import kurtosis
+    from rsk_engine import RollingSampleKurtosis
+
+    data = loadmat('../3_kurtosis_validation/import_data/arm_wrestling_slow_results.mat')
+    tilt = data['watch_tiltAngle_filt'].flatten()
+    repetition = len(tilt)//15
+
+    start_time = timeit.default_timer()
+    perRepetition = repetition_kurtosis(tilt)
+    print('Per repetition kurtosis in ', (timeit.default_timer() - start_time)*1000, ' ms: ', perRepetition)
+    print('Using scipy.stats: ', kurtosis(tilt.reshape(15, -1), axis=1, fisher=False))
+
+    # Same values with the per-sample rolling kurtosis, reading the output at the end of every repetition
+    start_time = timeit.default_timer()
+    rsk = RollingSampleKurtosis(repetition)
+    subsampled = []
+    for i, value in enumerate(tilt):
+        rsk.push(value)
+        if (i + 1) % repetition == 0:
+            subsampled.append(rsk.kurtosis)
+    print('Rolling + subsampling in ', (timeit.default_timer() - start_time)*1000, ' ms: ', np.array(subsampled))
+
+    # Windows of 2 repetitions every half repetition
+    hop = repetition//2
+    hopping = hopping_kurtosis(tilt, 4*hop, hop)
+    print('Hopping windows: ', hopping[:4], ' first one using scipy.stats: ', kurtosis(tilt[:4*hop], fisher=False))